@@ -0,0 +1,85 @@
+import time
+import logging
+from array import array
+
+logger = logging.getLogger(__name__)
+
+
+class FloodDetector:
+    """Счетчики частоты сообщений по (chat_id, user_id)
+
+    Token bucket: max_messages сообщений подряд, дальше пополнение со
+    скоростью max_messages / window в секунду. Состояние лежит в двух
+    массивах double (остаток токенов и время последнего сообщения), словарь
+    хранит только номер ячейки - O(1) на сообщение и ~16 байт на счетчик
+    помимо ключа. Раз в evict_interval секунд удаляются счетчики, которые
+    успели полностью пополниться: они ничем не отличаются от новых.
+    """
+
+    def __init__(self, max_messages=8, window=10.0, max_entries=50000, evict_interval=60.0):
+        self.capacity = float(max_messages)
+        self.rate = max_messages / window
+        self.window = window
+        self.max_entries = max_entries
+        self.evict_interval = evict_interval
+        self._slots = {}            # (chat_id, user_id) -> номер ячейки
+        self._tokens = array('d')
+        self._stamps = array('d')
+        self._free = []
+        self._next_evict = time.monotonic() + evict_interval
+
+    def hit(self, chat_id, user_id):
+        """Учесть сообщение. True - превышен лимит (счетчик сбрасывается)"""
+        now = time.monotonic()
+        if now >= self._next_evict:
+            self._evict(now)
+
+        key = (chat_id, user_id)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._allocate(key, now)
+            tokens = self.capacity
+        else:
+            tokens = min(self.capacity, self._tokens[slot] + (now - self._stamps[slot]) * self.rate)
+
+        self._stamps[slot] = now
+        if tokens < 1:
+            # Нарушитель получает мут; после него счет начинается заново
+            self._tokens[slot] = self.capacity
+            return True
+        self._tokens[slot] = tokens - 1
+        return False
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _allocate(self, key, now):
+        if not self._free and len(self._tokens) >= self.max_entries:
+            self._evict(now)
+            if not self._free:
+                self._evict_oldest(len(self._slots) // 2)
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._tokens)
+            self._tokens.append(0.0)
+            self._stamps.append(0.0)
+        self._slots[key] = slot
+        return slot
+
+    def _evict(self, now):
+        """Освободить ячейки, простоявшие дольше window (бакет уже полон)"""
+        self._next_evict = now + self.evict_interval
+        stamps = self._stamps
+        idle = [key for key, slot in self._slots.items() if now - stamps[slot] >= self.window]
+        for key in idle:
+            self._free.append(self._slots.pop(key))
+
+    def _evict_oldest(self, count):
+        """Переполнение активными счетчиками: вытеснить count самых старых"""
+        stamps = self._stamps
+        oldest = sorted(self._slots.items(), key=lambda item: stamps[item[1]])[:max(count, 1)]
+        for key, slot in oldest:
+            del self._slots[key]
+            self._free.append(slot)
+        logger.warning(f"Flood detector is full, evicted {len(oldest)} active counters")
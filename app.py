@@ -1,7 +1,8 @@
-import os
+import sys
+import time
+import random
 import asyncio
 import logging
-from bot_main import main
 
 # Настройка логирования для bothost
 logging.basicConfig(
@@ -10,15 +11,64 @@ logging.basicConfig(
 )
 
 async def run_bot():
-    """Запуск бота для bothost"""
-    try:
-        await main()
-    except Exception as e:
-        logging.error(f"Bot crashed: {e}")
-        # Перезапуск через 60 секунд при падении
-        await asyncio.sleep(60)
-        await run_bot()
+    """Запуск бота для bothost с перезапуском после падения
+
+    Перезапуск в цикле, а не рекурсией: задержка растет экспоненциально
+    со случайным разбросом и сбрасывается после долгой стабильной работы.
+    """
+    started = time.perf_counter()
+    # Импорт бота - первая фаза запуска, она попадает в отчет main()
+    from bot_main import main, db
+    from config import RESTART_MIN_DELAY, RESTART_MAX_DELAY, RESTART_RESET_AFTER
+
+    failures = 0
+    while True:
+        try:
+            await main(started)
+            return
+        except Exception as e:
+            logging.error(f"Bot crashed: {e}")
+            # Не терять записи, накопленные в очереди на момент падения
+            await db.flush()
+
+        if time.perf_counter() - started > RESTART_RESET_AFTER:
+            failures = 0
+        delay = min(RESTART_MAX_DELAY, RESTART_MIN_DELAY * 2 ** failures) * random.uniform(0.5, 1.0)
+        failures += 1
+        logging.info(f"Restarting in {delay:.1f}s (failure #{failures})")
+        await asyncio.sleep(delay)
+        started = time.perf_counter()
+
+async def run_sharded():
+    """Шардированный режим: фронт с webhook и SHARD_COUNT процессов-обработчиков"""
+    from config import (
+        SHARD_COUNT, BOT_TOKEN, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET
+    )
+    from sharding import ShardRouter
+    router = ShardRouter(
+        SHARD_COUNT,
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        path=WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        webhook_url=WEBHOOK_URL,
+        bot_token=BOT_TOKEN
+    )
+    await router.run()
 
 if __name__ == '__main__':
+    from config import SHARD_COUNT, BOT_MODE, WEBHOOK_URL, WEBHOOK_SECRET
+    # Без секрета webhook принял бы поддельные обновления - не запускаться вовсе
+    if (SHARD_COUNT > 1 or BOT_MODE == 'webhook') and not (WEBHOOK_SECRET or WEBHOOK_URL):
+        sys.exit("WEBHOOK_SECRET is required in webhook mode when WEBHOOK_URL is not set")
     # Запуск асинхронно для bothost
-    asyncio.run(run_bot())
+    if SHARD_COUNT > 1:
+        asyncio.run(run_sharded())
+    else:
+        try:
+            asyncio.run(run_bot())
+        finally:
+            # Остановка по Ctrl+C/сигналу: дописать очередь без цикла событий
+            bot_main = sys.modules.get('bot_main')
+            if bot_main is not None:
+                bot_main.db.close()
@@ -0,0 +1,199 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from metrics import DB_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabase:
+    """Асинхронный фасад над Database
+
+    Чтения выполняются в отдельном пуле потоков, все записи проходят через
+    единственный поток-писатель (очередь executor'а), поэтому медленный commit
+    не блокирует цикл обработки обновлений и записи не конкурируют за блокировку.
+
+    Записи копятся до batch_delay секунд или batch_size штук и уходят писателю
+    одной транзакцией (Database.run_batch). durable=True (по умолчанию) - вызов
+    ждет commit своей пачки и возвращает результат метода; durable=False -
+    возвращает None сразу, запись будет выполнена со следующей пачкой.
+    """
+
+    def __init__(self, database, read_workers=4, batch_delay=0.005, batch_size=100):
+        self.db = database
+        self.cache = database.cache
+        self.batch_delay = batch_delay
+        self.batch_size = batch_size
+        self._readers = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix='db-read')
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-write')
+        self._pending = []      # (метод, аргументы, future)
+        self._flush_handle = None
+        self._in_flight = set()
+
+    async def _read(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, _timed, func, *args)
+
+    async def _write(self, func, *args, durable=True):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((func, args, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_delay, self._flush)
+        if not durable:
+            return None
+        return await future
+
+    async def _write_now(self, func, *args):
+        """Запись вне пачек (долгие операции со своими транзакциями)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, _timed, func, *args)
+
+    def _flush(self):
+        """Передать накопленные записи писателю одной пачкой
+
+        Пачки попадают в очередь однопоточного executor'а в порядке вызова,
+        поэтому записи выполняются в том же порядке, в каком были поставлены.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        calls = [(functools.partial(_timed, func), args) for func, args, _ in batch]
+        task = asyncio.get_running_loop().run_in_executor(self._writer, _timed, self.db.run_batch, calls)
+        self._in_flight.add(task)
+        task.add_done_callback(functools.partial(self._resolve, batch))
+
+    def _resolve(self, batch, task):
+        self._in_flight.discard(task)
+        results = None if task.cancelled() or task.exception() else task.result()
+        if results is None:
+            # Пачка откачена целиком: каждый вызов получает неуспех
+            results = [False] * len(batch)
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def flush(self):
+        """Записать все накопленное и дождаться commit (при остановке)"""
+        self._flush()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def flush_pending(self):
+        """Синхронно записать накопленное, когда цикл событий уже недоступен
+
+        Путь аварийного завершения: future ожидающих вызовов не трогаются,
+        их цикл событий мог уже закрыться.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            calls = [(func, args) for func, args, _ in batch]
+            self._writer.submit(self.db.run_batch, calls).result()
+
+    def pending_writes(self):
+        """Записи, ожидающие потока-писателя"""
+        return len(self._pending) + self._writer._work_queue.qsize()
+
+    # Запуск
+
+    async def open(self):
+        """Создать схему и применить миграции (до любых других запросов)"""
+        return await self._write_now(self.db.init_db)
+
+    async def warm_up(self):
+        """Загрузить кэш модерации одним проходом по таблицам"""
+        return await self._read(self.db.load_moderation_cache)
+
+    # Чтение
+
+    async def get_user_by_telegram_id(self, telegram_id):
+        return await self._read(self.db.get_user_by_telegram_id, telegram_id)
+
+    async def is_banned(self, roblox_id):
+        return await self._read(self.db.is_banned, roblox_id)
+
+    async def is_muted(self, roblox_id):
+        return await self._read(self.db.is_muted, roblox_id)
+
+    async def get_all_groups(self):
+        return await self._read(self.db.get_all_groups)
+
+    async def get_upcoming_expirations(self, since, until):
+        return await self._read(self.db.get_upcoming_expirations, since, until)
+
+    async def refresh_cache(self, kind, key):
+        return await self._read(self.db.refresh_cache, kind, key)
+
+    async def load_persistence(self):
+        return await self._read(self.db.load_persistence)
+
+    async def get_callback_action(self, token):
+        return await self._read(self.db.get_callback_action, token)
+
+    async def get_delayed_actions(self):
+        return await self._read(self.db.get_delayed_actions)
+
+    # Запись
+
+    async def add_user(self, telegram_id, roblox_username, roblox_id, verification_code, durable=True):
+        return await self._write(self.db.add_user, telegram_id, roblox_username, roblox_id, verification_code, durable=durable)
+
+    async def update_verification_code(self, telegram_id, verification_code, durable=True):
+        return await self._write(self.db.update_verification_code, telegram_id, verification_code, durable=durable)
+
+    async def verify_user(self, roblox_id, durable=True):
+        return await self._write(self.db.verify_user, roblox_id, durable=durable)
+
+    async def add_ban(self, roblox_id, reason, duration, banned_by, is_permanent=False, durable=True):
+        return await self._write(self.db.add_ban, roblox_id, reason, duration, banned_by, is_permanent, durable=durable)
+
+    async def add_mute(self, roblox_id, reason, duration, muted_by, durable=True):
+        return await self._write(self.db.add_mute, roblox_id, reason, duration, muted_by, durable=durable)
+
+    async def add_sanctions_bulk(self, kind, roblox_ids, reason, duration, issued_by, is_permanent=False, durable=True):
+        return await self._write(self.db.add_sanctions_bulk, kind, roblox_ids, reason, duration, issued_by, is_permanent, durable=durable)
+
+    async def save_callback_actions(self, rows, durable=True):
+        return await self._write(self.db.save_callback_actions, rows, durable=durable)
+
+    async def add_group(self, group_id, group_title, added_by, durable=True):
+        return await self._write(self.db.add_group, group_id, group_title, added_by, durable=durable)
+
+    async def archive_expired(self, batch_size=500):
+        # Сама коммитит пачками, поэтому идет мимо очереди записи
+        return await self._write_now(self.db.archive_expired, batch_size)
+
+    async def save_persistence(self, upserts, deletes, durable=True):
+        return await self._write(self.db.save_persistence, upserts, deletes, durable=durable)
+
+    async def save_delayed_actions(self, actions, durable=True):
+        return await self._write(self.db.save_delayed_actions, actions, durable=durable)
+
+    async def remove_delayed_actions(self, keys, durable=True):
+        return await self._write(self.db.remove_delayed_actions, keys, durable=durable)
+
+    def close(self):
+        """Дописать очередь записи и закрыть соединения"""
+        self.flush_pending()
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        self.db.pool.close_all()
+
+
+def _timed(func, *args):
+    """Выполнить метод Database в потоке пула и записать время выполнения"""
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        DB_SECONDS.observe(time.perf_counter() - started, func.__name__)
@@ -0,0 +1,484 @@
+"""Нагрузочный тест бота на локальных заглушках Telegram Bot API и Roblox API
+
+Запускает настоящие обработчики из bot_main (build_application + start_services)
+в отдельной временной папке с новой БД, а вместо внешних сервисов поднимает
+aiohttp-серверы с настраиваемой задержкой и долей ошибок. Сценарии:
+
+  gate     - поток сообщений в группах через handle_message;
+  register - волна регистраций: start_auth -> ник (process_username) -> check_verification;
+  bans     - массовые баны через кнопки execute_ban.
+
+Для каждого сценария выводится сообщений в секунду, p50/p99 задержки
+обработки обновления, число запросов к БД и исходящих вызовов на сообщение.
+Результат сохраняется в JSON; с --compare сравнивается с прошлым прогоном
+и завершается с кодом 1 при регрессии больше --tolerance.
+
+    python benchmark.py --messages 5000 --output baseline.json
+    python benchmark.py --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+BENCH_TOKEN = '123456:BENCHMARK'
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+ROBLOX_ID_BASE = 1_000_000
+
+
+class FakeService:
+    """Общее для заглушек: задержка ответа и случайные ошибки"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self._runner = None
+
+    async def delay(self):
+        self.calls += 1
+        if self.latency:
+            # Экспоненциальный разброс вокруг средней задержки
+            await asyncio.sleep(self.random.expovariate(1 / self.latency))
+
+    def fail(self):
+        return self.error_rate and self.random.random() < self.error_rate
+
+    async def start(self, app):
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '127.0.0.1', 0).start()
+        return self._runner.addresses[0][1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+class FakeTelegram(FakeService):
+    """POST /bot<token>/<method>; error_rate - доля 500, flood_rate - доля 429"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, flood_rate=0.0, seed=0):
+        super().__init__(latency, error_rate, seed)
+        self.flood_rate = flood_rate
+        self.methods = {}
+        self._message_id = 0
+
+    async def handle(self, request):
+        await self.delay()
+        method = request.match_info['path'].rsplit('/', 1)[-1]
+        self.methods[method] = self.methods.get(method, 0) + 1
+        if self.fail():
+            return web.json_response({'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}, status=500)
+        if self.flood_rate and self.random.random() < self.flood_rate:
+            return web.json_response({
+                'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                'parameters': {'retry_after': 1}
+            }, status=429)
+
+        data = await request.post()
+        if method == 'getMe':
+            result = BOT_USER
+        elif method in ('sendMessage', 'editMessageText'):
+            self._message_id += 1
+            chat_id = int(data.get('chat_id', 0))
+            result = {
+                'message_id': int(data.get('message_id', self._message_id)),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'supergroup' if chat_id < 0 else 'private'},
+                'from': BOT_USER,
+                'text': data.get('text', ''),
+            }
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/{path:.*}', self.handle)
+        return await super().start(app)
+
+
+class FakeRoblox(FakeService):
+    """Заглушка users.roblox.com и legacy API: имя bench_<n> -> ID ROBLOX_ID_BASE + n"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        super().__init__(latency, error_rate, seed)
+        self.descriptions = {}  # roblox_id -> описание профиля
+
+    @staticmethod
+    def user_id(name):
+        prefix, _, number = name.lower().partition('_')
+        return ROBLOX_ID_BASE + int(number) if prefix == 'bench' and number.isdigit() else None
+
+    def user(self, user_id):
+        return {'id': user_id, 'name': f'bench_{user_id - ROBLOX_ID_BASE}', 'displayName': 'Bench',
+                'description': self.descriptions.get(user_id, '')}
+
+    async def handle_legacy(self, request):
+        await self.delay()
+        if self.fail():
+            return web.Response(status=500)
+        user_id = self.user_id(request.query.get('username', ''))
+        if user_id is None:
+            return web.json_response({'success': False}, status=404)
+        return web.json_response({'Id': user_id, 'Username': request.query['username']})
+
+    async def handle_usernames(self, request):
+        await self.delay()
+        if self.fail():
+            return web.Response(status=500)
+        body = await request.json()
+        data = [
+            {'requestedUsername': name, 'id': self.user_id(name), 'name': name}
+            for name in body.get('usernames', []) if self.user_id(name) is not None
+        ]
+        return web.json_response({'data': data})
+
+    async def handle_users(self, request):
+        await self.delay()
+        if self.fail():
+            return web.Response(status=500)
+        body = await request.json()
+        return web.json_response({'data': [
+            self.user(user_id) for user_id in body.get('userIds', []) if user_id >= ROBLOX_ID_BASE
+        ]})
+
+    async def handle_user(self, request):
+        await self.delay()
+        if self.fail():
+            return web.Response(status=500)
+        return web.json_response(self.user(int(request.match_info['user_id'])))
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/users/get-by-username', self.handle_legacy)
+        app.router.add_post('/v1/usernames/users', self.handle_usernames)
+        app.router.add_post('/v1/users', self.handle_users)
+        app.router.add_get('/v1/users/{user_id}', self.handle_user)
+        return await super().start(app)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Bench:
+    """Прогон сценариев на запущенном Application"""
+
+    def __init__(self, bot_main, application, telegram, roblox, args):
+        self.bot_main = bot_main
+        self.application = application
+        self.telegram = telegram
+        self.roblox = roblox
+        self.args = args
+        self.random = random.Random(args.seed)
+        self._update_id = 0
+
+    # Построение обновлений
+
+    def _next_id(self):
+        self._update_id += 1
+        return self._update_id
+
+    def message(self, chat_id, user_id, text):
+        from telegram import Update
+        update_id = self._next_id()
+        return Update.de_json({
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'supergroup' if chat_id < 0 else 'private', 'title': 'Bench'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'},
+                'text': text,
+            },
+        }, self.application.bot)
+
+    def callback(self, user_id, data):
+        from telegram import Update
+        update_id = self._next_id()
+        return Update.de_json({
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'chat_instance': 'bench',
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'},
+                'data': data,
+                'message': {
+                    'message_id': update_id,
+                    'date': int(time.time()),
+                    'chat': {'id': user_id, 'type': 'private'},
+                    'from': BOT_USER,
+                    'text': 'bench',
+                },
+            },
+        }, self.application.bot)
+
+    async def process(self, update, latencies):
+        """Обработать обновление так же, как это делает Updater, и замерить время"""
+        started = time.perf_counter()
+        await self.application.update_processor.process_update(
+            update, self.application.process_update(update)
+        )
+        latencies.append(time.perf_counter() - started)
+
+    # Подготовка данных
+
+    def user_telegram_id(self, n):
+        return 10_000_000 + n
+
+    async def setup(self):
+        db = self.bot_main.db
+        for group in range(self.args.groups):
+            await db.add_group(self.group_id(group), f'Bench {group}', BOT_USER['id'])
+        for n in range(self.args.users):
+            roblox_id = ROBLOX_ID_BASE + n
+            await db.add_user(self.user_telegram_id(n), f'bench_{n}', roblox_id, 'BENCH')
+            await db.verify_user(roblox_id)
+
+    def group_id(self, group):
+        return -1_000_000_000_000 - group
+
+    # Учет внешних вызовов
+
+    def snapshot(self):
+        from metrics import DB_SECONDS
+        # run_batch - транзакция пачки записей, сами записи учтены по методам
+        batches = DB_SECONDS.count('run_batch')
+        return {
+            'db': DB_SECONDS.total() - batches,
+            'db_batches': batches,
+            'telegram': self.telegram.calls,
+            'roblox': self.roblox.calls,
+        }
+
+    async def drain(self, timeout=30):
+        """Дождаться фоновых вызовов (рассылки, ограничения), чтобы их учесть"""
+        deadline = time.monotonic() + timeout
+        calls = None
+        # Очередь пуста и за последний интервал не было новых вызовов
+        while time.monotonic() < deadline:
+            if not self.bot_main.broadcaster.pending_count() and calls == self.telegram.calls:
+                return
+            calls = self.telegram.calls
+            await asyncio.sleep(0.1 + self.telegram.latency * 5)
+
+    async def run(self, name, jobs):
+        """jobs - список корутин-функций job(latencies) -> число обработанных обновлений"""
+        latencies = []
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def bounded(job):
+            async with semaphore:
+                return await job(latencies)
+
+        before = self.snapshot()
+        started = time.perf_counter()
+        counts = await asyncio.gather(*(bounded(job) for job in jobs))
+        elapsed = time.perf_counter() - started
+        await self.drain()
+        after = self.snapshot()
+
+        messages = sum(counts) or 1
+        result = {
+            'updates': sum(counts),
+            'seconds': round(elapsed, 3),
+            'msgs_per_sec': round(sum(counts) / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'db_ops_per_msg': round((after['db'] - before['db']) / messages, 3),
+            'db_batches_per_msg': round((after['db_batches'] - before['db_batches']) / messages, 3),
+            'telegram_calls_per_msg': round((after['telegram'] - before['telegram']) / messages, 3),
+            'roblox_calls_per_msg': round((after['roblox'] - before['roblox']) / messages, 3),
+        }
+        print(f"{name:>9}: " + ', '.join(f'{key}={value}' for key, value in result.items()))
+        return result
+
+    # Сценарии
+
+    async def gate(self):
+        """Сообщения в группах: часть от верифицированных, часть от незнакомых"""
+        def job(chat_id, user_id):
+            async def run(latencies):
+                await self.process(self.message(chat_id, user_id, 'hello'), latencies)
+                return 1
+            return run
+
+        jobs = []
+        for _ in range(self.args.messages):
+            chat_id = self.group_id(self.random.randrange(self.args.groups))
+            if self.random.random() < self.args.unverified_ratio:
+                user_id = 50_000_000 + self.random.randrange(self.args.users)
+            else:
+                user_id = self.user_telegram_id(self.random.randrange(self.args.users))
+            jobs.append(job(chat_id, user_id))
+        return await self.run('gate', jobs)
+
+    async def register(self):
+        """Регистрация новых пользователей: три обновления на пользователя"""
+        first = self.args.users
+
+        def job(n):
+            async def run(latencies):
+                telegram_id = self.user_telegram_id(n)
+                await self.process(self.callback(telegram_id, 'start_auth'), latencies)
+                await self.process(self.message(telegram_id, telegram_id, f'bench_{n}'), latencies)
+                # Пользователь добавляет код в профиль
+                row = self.bot_main.db.db.get_user_by_telegram_id(telegram_id)
+                if row is not None:
+                    self.roblox.descriptions[row[3]] = f'bench profile {row[6]}'
+                await self.process(self.callback(telegram_id, 'check_verification'), latencies)
+                return 3
+            return run
+
+        return await self.run('register', [job(first + n) for n in range(self.args.registrations)])
+
+    async def bans(self):
+        """Баны через кнопки: токен действия создается так же, как в handle_admin_action"""
+        admins = self.bot_main.ADMIN_IDS
+        targets = self.random.sample(range(self.args.users), min(self.args.bans, self.args.users))
+        tokens = await self.bot_main.callbacks.create_many([
+            ('ban', {'roblox_id': str(ROBLOX_ID_BASE + n), 'reason': 'benchmark', 'duration': '1d'})
+            for n in targets
+        ])
+
+        def job(admin_id, token):
+            async def run(latencies):
+                await self.process(self.callback(admin_id, token), latencies)
+                return 1
+            return run
+
+        return await self.run('bans', [job(admins[i % len(admins)], token) for i, token in enumerate(tokens)])
+
+
+def compare(results, baseline, tolerance):
+    """Список регрессий относительно прошлого прогона"""
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        if current['msgs_per_sec'] < previous['msgs_per_sec'] * (1 - tolerance):
+            regressions.append(f"{name}: msgs_per_sec {previous['msgs_per_sec']} -> {current['msgs_per_sec']}")
+        for key in ('p99_ms', 'db_ops_per_msg', 'telegram_calls_per_msg', 'roblox_calls_per_msg'):
+            # Небольшие абсолютные значения не считаем регрессией из-за шума
+            if current[key] > previous[key] * (1 + tolerance) and current[key] - previous[key] > 0.01:
+                regressions.append(f"{name}: {key} {previous[key]} -> {current[key]}")
+    return regressions
+
+
+async def run_benchmark(args):
+    telegram = FakeTelegram(args.telegram_latency / 1000, args.telegram_error_rate, args.telegram_flood_rate, args.seed)
+    roblox = FakeRoblox(args.roblox_latency / 1000, args.roblox_error_rate, args.seed)
+    telegram_port = await telegram.start()
+    roblox_port = await roblox.start()
+
+    # Настройки читаются config.py при импорте bot_main
+    admins = [str(90_000_000 + i) for i in range(args.admins)]
+    os.environ.update({
+        'BOT_TOKEN': BENCH_TOKEN,
+        'TELEGRAM_API_URL': f'http://127.0.0.1:{telegram_port}/bot',
+        'ROBLOX_LEGACY_URL': f'http://127.0.0.1:{roblox_port}',
+        'ROBLOX_USERS_URL': f'http://127.0.0.1:{roblox_port}',
+        'ADMIN_IDS': ','.join(admins),
+        'ADMIN_HANDLER_CONCURRENCY': str(args.admins),
+        'METRICS_PORT': '0',
+        'SHARD_COUNT': '1',
+        # Удаления предупреждений не должны срабатывать посреди следующих сценариев
+        'WARNING_DELETE_DELAY': '3600',
+    })
+    if args.no_flood_limit:
+        os.environ['FLOOD_MAX_MESSAGES'] = '0'
+    if not args.real_rate_limits:
+        # С настоящими лимитами рассылка по группам растягивается на минуты
+        # и исходящие вызовы не успевают попасть в замер
+        os.environ['BROADCAST_GLOBAL_RATE'] = '100000'
+        os.environ['BROADCAST_CHAT_RATE'] = '100000'
+
+    workdir = tempfile.mkdtemp(prefix='bot-bench-')
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import bot_main
+
+    application = bot_main.build_application(polling=False)
+    await bot_main.initialize(application)
+    await application.start()
+    await bot_main.start_services(application, metrics_port=0)
+
+    bench = Bench(bot_main, application, telegram, roblox, args)
+    results = {
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'scenarios': {},
+    }
+    try:
+        await bench.setup()
+        for name in args.scenarios:
+            results['scenarios'][name] = await getattr(bench, name)()
+        results['telegram_methods'] = dict(sorted(telegram.methods.items()))
+    finally:
+        await bot_main.stop_services()
+        await application.stop()
+        await application.shutdown()
+        bot_main.db.close()
+        await telegram.stop()
+        await roblox.stop()
+    print(f"Database and logs: {workdir}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scenarios', nargs='+', default=['gate', 'register', 'bans'],
+                        choices=['gate', 'register', 'bans'])
+    parser.add_argument('--messages', type=int, default=5000, help='сообщений в сценарии gate')
+    parser.add_argument('--registrations', type=int, default=200)
+    parser.add_argument('--bans', type=int, default=200)
+    parser.add_argument('--users', type=int, default=2000, help='заранее верифицированных пользователей')
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--admins', type=int, default=4)
+    parser.add_argument('--unverified-ratio', type=float, default=0.1)
+    parser.add_argument('--concurrency', type=int, default=256, help='обновлений в обработке одновременно')
+    parser.add_argument('--no-flood-limit', action='store_true', help='отключить антифлуд')
+    parser.add_argument('--real-rate-limits', action='store_true', help='лимиты рассылки как в config.py')
+    parser.add_argument('--telegram-latency', type=float, default=20, help='мс')
+    parser.add_argument('--telegram-error-rate', type=float, default=0.0)
+    parser.add_argument('--telegram-flood-rate', type=float, default=0.0, help='доля ответов 429')
+    parser.add_argument('--roblox-latency', type=float, default=50, help='мс')
+    parser.add_argument('--roblox-error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='JSON прошлого прогона')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='допустимое ухудшение (доля)')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    results = asyncio.run(run_benchmark(args))
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Results saved to {output}")
+
+    if baseline_path:
+        with open(baseline_path, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == '__main__':
+    main()
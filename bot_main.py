@@ -1,7 +1,7 @@
 import logging
 import random
+import re
 import string
-import requests
 import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -9,7 +9,40 @@ from telegram.ext import (
     ContextTypes, filters
 )
 from database import Database
-from config import BOT_TOKEN, ADMIN_IDS, BAN_DURATIONS, MUTE_DURATIONS
+from async_database import AsyncDatabase
+from roblox_api import RobloxAPI
+from roblox_batch import BatchedRobloxAPI
+from roblox_cache import CachedRobloxAPI
+from verification import VerificationPoller
+from broadcast import Broadcaster
+from expiry import ExpiryScheduler
+from sanctions import SanctionEnforcer
+from delayed_actions import DelayedActionScheduler
+from gate_warnings import WarningDebouncer, WARN, SUMMARY
+from antiflood import FloodDetector
+from update_processing import ChatOrderedUpdateProcessor, ConcurrencyLimit
+from persistence import SQLitePersistence
+from callback_actions import CallbackRegistry
+from metrics import (
+    MetricsServer, InstrumentedRequest, StartupTimer, QUEUE_DEPTH,
+    count_errors, instrument_application, track_handler
+)
+from config import (
+    BOT_TOKEN, TELEGRAM_API_URL, ADMIN_IDS, BAN_DURATIONS, MUTE_DURATIONS, DB_READ_WORKERS, DB_BATCH_DELAY, DB_BATCH_SIZE,
+    ROBLOX_LEGACY_URL, ROBLOX_USERS_URL, ROBLOX_TIMEOUT, ROBLOX_MAX_RETRIES, ROBLOX_BACKOFF, ROBLOX_MAX_CONNECTIONS, ROBLOX_MAX_PER_HOST,
+    ROBLOX_CACHE_SIZE, ROBLOX_ID_TTL, ROBLOX_NOT_FOUND_TTL, ROBLOX_DESCRIPTION_TTL, ROBLOX_RECHECK_COOLDOWN,
+    ROBLOX_BATCH_WINDOW, ROBLOX_BATCH_SIZE,
+    VERIFY_POLL_WORKERS, VERIFY_POLL_INITIAL_DELAY, VERIFY_POLL_MAX_DELAY, VERIFY_POLL_DEADLINE,
+    BROADCAST_CONCURRENCY, BROADCAST_GLOBAL_RATE, BROADCAST_CHAT_RATE, BROADCAST_MAX_RETRIES,
+    EXPIRY_HORIZON, EXPIRY_ARCHIVE_INTERVAL, EXPIRY_ARCHIVE_BATCH, EXPIRY_GRACE,
+    WARNING_WINDOW, WARNING_AGGREGATE_THRESHOLD, WARNING_DELETE_DELAY,
+    FLOOD_MAX_MESSAGES, FLOOD_WINDOW, FLOOD_MUTE_DURATION, FLOOD_MAX_ENTRIES,
+    DELAYED_ACTIONS_PERSIST, DELAYED_ACTIONS_CONCURRENCY, DELAYED_ACTIONS_BATCH,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET,
+    UPDATE_WORKERS, ADMIN_HANDLER_CONCURRENCY, SHARD_COUNT, BULK_MAX_IDS, BULK_MAX_FILE_SIZE,
+    PERSISTENCE_UPDATE_INTERVAL, PERSISTENCE_FLUSH_INTERVAL, CALLBACK_CACHE_SIZE, CALLBACK_TTL,
+    METRICS_LISTEN, METRICS_PORT
+)
 
 # Настройка логирования для bothost
 logging.basicConfig(
@@ -18,52 +51,130 @@ logging.basicConfig(
 )
 
 logger = logging.getLogger(__name__)
-db = Database()
-
-class RobloxAPI:
-    @staticmethod
-    def get_user_id(username):
-        """Получить ID пользователя Roblox по имени"""
-        try:
-            response = requests.get(
-                f"https://api.roblox.com/users/get-by-username?username={username}",
-                timeout=10
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('Id')
-            else:
-                logger.warning(f"Roblox API returned status {response.status_code} for username {username}")
-        except Exception as e:
-            logger.error(f"Error getting Roblox user ID: {e}")
-        return None
-    
-    @staticmethod
-    def get_user_description(user_id):
-        """Получить описание профиля пользователя Roblox"""
-        try:
-            response = requests.get(
-                f"https://users.roblox.com/v1/users/{user_id}",
-                timeout=10
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('description', '')
-            else:
-                logger.warning(f"Roblox API returned status {response.status_code} for user_id {user_id}")
-        except Exception as e:
-            logger.error(f"Error getting Roblox user description: {e}")
-        return ''
+count_errors()
+# Все обращения к SQLite из обработчиков идут через потоки, а не через цикл событий
+db = AsyncDatabase(
+    Database(),
+    read_workers=DB_READ_WORKERS,
+    batch_delay=DB_BATCH_DELAY,
+    batch_size=DB_BATCH_SIZE
+)
+roblox = CachedRobloxAPI(
+    BatchedRobloxAPI(
+        RobloxAPI(
+            legacy_url=ROBLOX_LEGACY_URL,
+            users_url=ROBLOX_USERS_URL,
+            timeout=ROBLOX_TIMEOUT,
+            max_retries=ROBLOX_MAX_RETRIES,
+            backoff=ROBLOX_BACKOFF,
+            max_connections=ROBLOX_MAX_CONNECTIONS,
+            max_per_host=ROBLOX_MAX_PER_HOST
+        ),
+        window=ROBLOX_BATCH_WINDOW,
+        max_size=ROBLOX_BATCH_SIZE
+    ),
+    maxsize=ROBLOX_CACHE_SIZE,
+    id_ttl=ROBLOX_ID_TTL,
+    not_found_ttl=ROBLOX_NOT_FOUND_TTL,
+    description_ttl=ROBLOX_DESCRIPTION_TTL,
+    recheck_cooldown=ROBLOX_RECHECK_COOLDOWN
+)
+# Рассылки по группам (оповещения и т.п.) идут через общую очередь
+# При шардировании глобальный лимит Telegram делится между процессами
+broadcaster = Broadcaster(
+    concurrency=BROADCAST_CONCURRENCY,
+    global_rate=BROADCAST_GLOBAL_RATE / SHARD_COUNT,
+    chat_rate=BROADCAST_CHAT_RATE,
+    max_retries=BROADCAST_MAX_RETRIES
+)
 
 def generate_verification_code():
     """Генерация 9-значного кода верификации"""
     return ''.join(random.choices(string.digits, k=9))
 
+def verification_success_text(user_data):
+    """Текст об успешной авторизации"""
+    return (
+        f"🎉 **Авторизация успешна!**\n\n"
+        f"Теперь вы можете писать в чатах, где есть этот бот.\n\n"
+        f"📊 **Ваш профиль:**\n"
+        f"• Roblox ник: {user_data[2]}\n"
+        f"• ID: {user_data[3]}\n"
+        f"• Дата регистрации: {user_data[7][:10] if user_data[7] else 'Неизвестно'}"
+    )
+
+async def announce_verification(first_name, roblox_username, roblox_id):
+    """Оповестить все группы о новом авторизованном пользователе (без ожидания отправки)"""
+    groups = await db.get_all_groups()
+    broadcaster.broadcast(
+        [group[0] for group in groups],
+        f"👋 Новый пользователь авторизовался:\n"
+        f"• Имя в Telegram: {first_name}\n"
+        f"• Roblox ник: {roblox_username}\n"
+        f"• Roblox ID: {roblox_id}"
+    )
+
+async def on_poll_verified(bot, entry):
+    """Фоновая проверка нашла код в профиле"""
+    user_data = await db.get_user_by_telegram_id(entry.telegram_id)
+    if user_data:
+        await bot.send_message(entry.telegram_id, verification_success_text(user_data))
+    await announce_verification(entry.first_name, entry.roblox_username, entry.roblox_id)
+
+async def on_poll_expired(bot, entry):
+    """Код так и не появился в профиле за отведенное время"""
+    await bot.send_message(
+        entry.telegram_id,
+        "⌛ Автоматическая проверка кода завершена. "
+        "Добавьте код в описание профиля и нажмите '✅ Я добавил код'."
+    )
+
+# Баны и муты применяются ограничениями Telegram во всех группах
+sanctions = SanctionEnforcer(db, broadcaster)
+# Кнопки с параметрами несут короткий токен, сами параметры хранятся здесь
+callbacks = CallbackRegistry(db, maxsize=CALLBACK_CACHE_SIZE, ttl=CALLBACK_TTL)
+# Предупреждения неавторизованным: не чаще раза в окно, удаление через общий планировщик
+warning_debouncer = WarningDebouncer(window=WARNING_WINDOW, aggregate_threshold=WARNING_AGGREGATE_THRESHOLD)
+flood_detector = FloodDetector(
+    max_messages=FLOOD_MAX_MESSAGES,
+    window=FLOOD_WINDOW,
+    max_entries=FLOOD_MAX_ENTRIES
+) if FLOOD_MAX_MESSAGES > 0 else None
+delayed_actions = DelayedActionScheduler(
+    db if DELAYED_ACTIONS_PERSIST else None,
+    concurrency=DELAYED_ACTIONS_CONCURRENCY,
+    batch_size=DELAYED_ACTIONS_BATCH
+)
+
+async def on_sanction_expired(kind, roblox_id):
+    """Снять ограничения в группах после окончания бана или мута"""
+    await sanctions.lift(kind, roblox_id)
+    logger.info(f"{kind} for Roblox ID {roblox_id} expired")
+
+expiry_scheduler = ExpiryScheduler(
+    db,
+    on_expired=on_sanction_expired,
+    horizon=EXPIRY_HORIZON,
+    archive_interval=EXPIRY_ARCHIVE_INTERVAL,
+    batch_size=EXPIRY_ARCHIVE_BATCH,
+    grace=EXPIRY_GRACE
+)
+
+verification_poller = VerificationPoller(
+    db, roblox,
+    on_verified=on_poll_verified,
+    on_expired=on_poll_expired,
+    workers=VERIFY_POLL_WORKERS,
+    initial_delay=VERIFY_POLL_INITIAL_DELAY,
+    max_delay=VERIFY_POLL_MAX_DELAY,
+    deadline=VERIFY_POLL_DEADLINE
+)
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
     try:
         user_id = update.effective_user.id
-        user = db.get_user_by_telegram_id(user_id)
+        user = await db.get_user_by_telegram_id(user_id)
         
         if user and user[5]:  # is_verified
             await show_profile(update, context)
@@ -105,35 +216,51 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Проверка на авторизацию для новых сообщений в группах
         if update.effective_chat.type in ['group', 'supergroup']:
-            user = db.get_user_by_telegram_id(user_id)
-            if not user or not user[5]:
+            # Состояние берется из резидентного кэша, без обращения к БД
+            user = db.cache.get_user(user_id)
+            if not user or not user.is_verified:
                 try:
                     await update.message.delete()
                 except:
                     pass  # Если не удалось удалить сообщение
                 
-                warning_msg = await update.message.reply_text(
-                    f"👤 {update.effective_user.first_name}, вы не авторизованы! "
-                    f"Используйте /start в ЛС с ботом для авторизации."
-                )
-                # Удалить предупреждение через 10 секунд
-                asyncio.create_task(delete_message_after_delay(context, update.effective_chat.id, warning_msg.message_id, 10))
+                chat_id = update.effective_chat.id
+                action = warning_debouncer.register(chat_id, user_id)
+                if action == WARN:
+                    warning_msg = await context.bot.send_message(
+                        chat_id,
+                        f"👤 {update.effective_user.first_name}, вы не авторизованы! "
+                        f"Используйте /start в ЛС с ботом для авторизации."
+                    )
+                elif action == SUMMARY:
+                    warning_msg = await context.bot.send_message(
+                        chat_id,
+                        f"🔒 Сообщения неавторизованных пользователей удаляются "
+                        f"(уже {warning_debouncer.unverified_count(chat_id)} за последние {WARNING_WINDOW} с). "
+                        f"Используйте /start в ЛС с ботом для авторизации."
+                    )
+                else:
+                    return
+                # Удалить предупреждение через WARNING_DELETE_DELAY секунд
+                delayed_actions.schedule_delete(chat_id, warning_msg.message_id, WARNING_DELETE_DELAY)
                 return
             
-            # Проверка бана
-            if db.is_banned(user[3]):  # roblox_id
-                try:
-                    await update.message.delete()
-                except:
-                    pass
-                return
+            # Проверка бана и мута. Обычно такие сообщения не доходят -
+            # Telegram сам ограничивает нарушителя; здесь запасной вариант.
+            # Пользователи без санкций отсеиваются проверкой вхождения в словари санкций
+            if db.cache.is_sanctioned(user.roblox_id):
+                for kind, check in (('ban', db.cache.is_banned), ('mute', db.cache.is_muted)):
+                    if check(user.roblox_id):
+                        try:
+                            await update.message.delete()
+                        except:
+                            pass
+                        sanctions.apply_in_chat(update.effective_chat.id, user_id, kind, user.roblox_id)
+                        return
             
-            # Проверка мута
-            if db.is_muted(user[3]):
-                try:
-                    await update.message.delete()
-                except:
-                    pass
+            # Антифлуд: при превышении лимита - автоматический мут
+            if flood_detector and user_id not in ADMIN_IDS and flood_detector.hit(update.effective_chat.id, user_id):
+                await mute_flooder(update, context, user.roblox_id)
                 return
         
         # Обработка процесса авторизации
@@ -146,13 +273,25 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.error(f"Error in handle_message: {e}")
 
-async def delete_message_after_delay(context, chat_id, message_id, delay):
-    """Удалить сообщение через указанное время"""
-    await asyncio.sleep(delay)
+async def mute_flooder(update: Update, context: ContextTypes.DEFAULT_TYPE, roblox_id):
+    """Автоматический мут за флуд на FLOOD_MUTE_DURATION"""
     try:
-        await context.bot.delete_message(chat_id, message_id)
+        await update.message.delete()
     except:
         pass
+    
+    chat_id = update.effective_chat.id
+    if not await db.add_mute(roblox_id, "Флуд", MUTE_DURATIONS[FLOOD_MUTE_DURATION], context.bot.id):
+        return
+    expiry_scheduler.schedule('mute', roblox_id, db.cache.get_expiry('mute', roblox_id))
+    await sanctions.apply('mute', roblox_id)
+    logger.info(f"Auto-muted roblox_id {roblox_id} for flooding in chat {chat_id}")
+    
+    notice = await context.bot.send_message(
+        chat_id,
+        f"🔇 {update.effective_user.first_name} замучен на {FLOOD_MUTE_DURATION} за флуд."
+    )
+    delayed_actions.schedule_delete(chat_id, notice.message_id, WARNING_DELETE_DELAY)
 
 async def process_username(update: Update, context: ContextTypes.DEFAULT_TYPE, username: str):
     """Обработка введенного имени пользователя Roblox"""
@@ -160,7 +299,7 @@ async def process_username(update: Update, context: ContextTypes.DEFAULT_TYPE, u
         user_id = update.effective_user.id
         
         # Проверяем существование пользователя Roblox
-        roblox_id = RobloxAPI.get_user_id(username)
+        roblox_id = await roblox.get_user_id(username)
         if not roblox_id:
             await update.message.reply_text(
                 "❌ Пользователь с таким именем не найден в Roblox. "
@@ -172,7 +311,7 @@ async def process_username(update: Update, context: ContextTypes.DEFAULT_TYPE, u
         verification_code = generate_verification_code()
         
         # Сохраняем пользователя в БД
-        success = db.add_user(user_id, username, roblox_id, verification_code)
+        success = await db.add_user(user_id, username, roblox_id, verification_code)
         if not success:
             await update.message.reply_text("❌ Ошибка при сохранении данных. Попробуйте еще раз.")
             return
@@ -180,6 +319,12 @@ async def process_username(update: Update, context: ContextTypes.DEFAULT_TYPE, u
         context.user_data['auth_step'] = 'waiting_verification'
         context.user_data['roblox_id'] = roblox_id
         
+        # Профиль будет проверяться в фоне, без нажатия кнопки
+        verification_poller.submit(
+            user_id, roblox_id, verification_code,
+            update.effective_user.first_name, username
+        )
+        
         keyboard = [
             [InlineKeyboardButton("✅ Я добавил код", callback_data="check_verification")],
             [InlineKeyboardButton("🔄 Сгенерировать новый код", callback_data="new_code")]
@@ -195,7 +340,7 @@ async def process_username(update: Update, context: ContextTypes.DEFAULT_TYPE, u
             f"1. Откройте Roblox\n"
             f"2. Перейдите в настройки профиля\n"
             f"3. Добавьте код в поле 'Описание'\n"
-            f"4. Нажмите кнопку '✅ Я добавил код'",
+            f"4. Бот проверит профиль автоматически или нажмите '✅ Я добавил код'",
             reply_markup=reply_markup,
             parse_mode='Markdown'
         )
@@ -214,43 +359,30 @@ async def check_verification(update: Update, context: ContextTypes.DEFAULT_TYPE)
         query = update.callback_query
         await query.answer()
         
-        user_data = db.get_user_by_telegram_id(query.from_user.id)
+        user_data = await db.get_user_by_telegram_id(query.from_user.id)
         if not user_data:
             await query.edit_message_text("❌ Ошибка: данные пользователя не найдены.")
             return
+        if user_data[5]:  # is_verified
+            # Старое сообщение с кнопками после фоновой проверки: убрать кнопки, не оповещать снова
+            await query.edit_message_text(verification_success_text(user_data))
+            return
         
         roblox_id = user_data[3]  # roblox_id
         verification_code = user_data[6]  # verification_code
         
         # Получаем описание профиля
-        description = RobloxAPI.get_user_description(roblox_id)
+        description = await roblox.get_user_description(roblox_id, recheck=True)
         
         if verification_code and verification_code in description:
             # Верификация успешна
-            db.verify_user(roblox_id)
+            verification_poller.cancel(query.from_user.id)
+            await db.verify_user(roblox_id)
             
-            await query.edit_message_text(
-                f"🎉 **Авторизация успешна!**\n\n"
-                f"Теперь вы можете писать в чатах, где есть этот бот.\n\n"
-                f"📊 **Ваш профиль:**\n"
-                f"• Roblox ник: {user_data[2]}\n"
-                f"• ID: {roblox_id}\n"
-                f"• Дата регистрации: {user_data[7][:10] if user_data[7] else 'Неизвестно'}"
-            )
+            await query.edit_message_text(verification_success_text(user_data))
             
             # Оповещаем все группы
-            groups = db.get_all_groups()
-            for group in groups:
-                try:
-                    await context.bot.send_message(
-                        group[0],
-                        f"👋 Новый пользователь авторизовался:\n"
-                        f"• Имя в Telegram: {query.from_user.first_name}\n"
-                        f"• Roblox ник: {user_data[2]}\n"
-                        f"• Roblox ID: {roblox_id}"
-                    )
-                except Exception as e:
-                    logger.error(f"Error sending notification to group {group[0]}: {e}")
+            await announce_verification(query.from_user.first_name, user_data[2], roblox_id)
         
         else:
             await query.answer("❌ Код не найден в описании профиля. Пожалуйста, добавьте код и попробуйте снова.", show_alert=True)
@@ -264,22 +396,22 @@ async def new_code(update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
         
-        user_data = db.get_user_by_telegram_id(query.from_user.id)
+        user_data = await db.get_user_by_telegram_id(query.from_user.id)
         if not user_data:
             await query.edit_message_text("❌ Ошибка: данные пользователя не найдены.")
             return
+        if user_data[5]:  # is_verified
+            await query.edit_message_text(verification_success_text(user_data))
+            return
         
         new_verification_code = generate_verification_code()
         
         # Обновляем код в базе данных
-        conn = db._Database__get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'UPDATE users SET verification_code = ? WHERE telegram_id = ?',
-            (new_verification_code, query.from_user.id)
+        await db.update_verification_code(query.from_user.id, new_verification_code)
+        verification_poller.submit(
+            query.from_user.id, user_data[3], new_verification_code,
+            query.from_user.first_name, user_data[2]
         )
-        conn.commit()
-        conn.close()
         
         keyboard = [
             [InlineKeyboardButton("✅ Я добавил код", callback_data="check_verification")],
@@ -302,14 +434,14 @@ async def show_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать профиль пользователя"""
     try:
         user_id = update.effective_user.id
-        user = db.get_user_by_telegram_id(user_id)
+        user = await db.get_user_by_telegram_id(user_id)
         
         if not user:
             await update.message.reply_text("❌ Профиль не найден. Используйте /start для авторизации.")
             return
         
-        is_banned = db.is_banned(user[3])
-        is_muted = db.is_muted(user[3])
+        is_banned = await db.is_banned(user[3])
+        is_muted = await db.is_muted(user[3])
         
         status = "✅ Активен"
         if is_banned:
@@ -377,6 +509,27 @@ async def ban_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.error(f"Error in ban_user: {e}")
 
+async def mute_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Мут пользователя"""
+    try:
+        query = update.callback_query
+        await query.answer()
+        
+        if query.from_user.id not in ADMIN_IDS:
+            await query.edit_message_text("❌ У вас нет доступа.")
+            return
+        
+        await query.edit_message_text(
+            "🔇 **Мут пользователя**\n\n"
+            "Введите Roblox ID пользователя и причину мута через пробел:\n"
+            "Пример: `123456789 Флуд`",
+            parse_mode='Markdown'
+        )
+        
+        context.user_data['admin_action'] = 'mute'
+    except Exception as e:
+        logger.error(f"Error in mute_user: {e}")
+
 async def handle_admin_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка действий администратора"""
     try:
@@ -395,14 +548,21 @@ async def handle_admin_action(update: Update, context: ContextTypes.DEFAULT_TYPE
             return
         
         roblox_id, reason = parts[0], parts[1]
+        if not (roblox_id.isascii() and roblox_id.isdigit() and int(roblox_id) > 0):
+            await update.message.reply_text(f"❌ Некорректный Roblox ID: {roblox_id}. Используйте: ID причина")
+            return
+        roblox_id = int(roblox_id)
         
         if context.user_data['admin_action'] == 'ban':
             # Создаем клавиатуру для выбора длительности бана
+            labels = {'1h': "1 час", '1d': "1 день", '7d': "7 дней", 'permanent': "Навсегда"}
+            tokens = await callbacks.create_many([
+                ('ban', {'roblox_id': roblox_id, 'reason': reason, 'duration': duration_type})
+                for duration_type in labels
+            ])
             keyboard = [
-                [InlineKeyboardButton("1 час", callback_data=f"ban_1h_{roblox_id}_{reason}")],
-                [InlineKeyboardButton("1 день", callback_data=f"ban_1d_{roblox_id}_{reason}")],
-                [InlineKeyboardButton("7 дней", callback_data=f"ban_7d_{roblox_id}_{reason}")],
-                [InlineKeyboardButton("Навсегда", callback_data=f"ban_permanent_{roblox_id}_{reason}")]
+                [InlineKeyboardButton(label, callback_data=token)]
+                for label, token in zip(labels.values(), tokens)
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
@@ -414,25 +574,52 @@ async def handle_admin_action(update: Update, context: ContextTypes.DEFAULT_TYPE
                 reply_markup=reply_markup
             )
         
+        elif context.user_data['admin_action'] == 'mute':
+            # Создаем клавиатуру для выбора длительности мута
+            labels = {'1h': "1 час", '6h': "6 часов", '1d': "1 день", '7d': "7 дней"}
+            tokens = await callbacks.create_many([
+                ('mute', {'roblox_id': roblox_id, 'reason': reason, 'duration': duration_type})
+                for duration_type in labels
+            ])
+            keyboard = [
+                [InlineKeyboardButton(label, callback_data=token)]
+                for label, token in zip(labels.values(), tokens)
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            await update.message.reply_text(
+                f"🔇 **Мут пользователя**\n\n"
+                f"Roblox ID: {roblox_id}\n"
+                f"Причина: {reason}\n\n"
+                f"Выберите длительность мута:",
+                reply_markup=reply_markup
+            )
+        
         context.user_data.pop('admin_action', None)
     except Exception as e:
         logger.error(f"Error in handle_admin_action: {e}")
 
-async def execute_ban(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def execute_ban(update: Update, context: ContextTypes.DEFAULT_TYPE, action: dict):
     """Выполнение бана"""
     try:
         query = update.callback_query
         await query.answer()
         
-        data = query.data.split('_')
-        duration_type = data[1]
-        roblox_id = data[2]
-        reason = '_'.join(data[3:])
+        if query.from_user.id not in ADMIN_IDS:
+            return
+        
+        duration_type = action['duration']
+        roblox_id = action['roblox_id']
+        reason = action['reason']
         
         duration = BAN_DURATIONS.get(duration_type)
         is_permanent = duration_type == 'permanent'
         
-        db.add_ban(roblox_id, reason, duration, query.from_user.id, is_permanent)
+        if not await db.add_ban(roblox_id, reason, duration, query.from_user.id, is_permanent):
+            await query.edit_message_text(f"❌ Не удалось забанить Roblox ID {roblox_id}: ошибка записи в базу.")
+            return
+        expiry_scheduler.schedule('ban', roblox_id, db.cache.get_expiry('ban', int(roblox_id)))
+        await sanctions.apply('ban', roblox_id)
         
         duration_text = "навсегда" if is_permanent else f"на {duration_type}"
         await query.edit_message_text(
@@ -445,6 +632,175 @@ async def execute_ban(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.error(f"Error in execute_ban: {e}")
 
+async def execute_mute(update: Update, context: ContextTypes.DEFAULT_TYPE, action: dict):
+    """Выполнение мута"""
+    try:
+        query = update.callback_query
+        await query.answer()
+        
+        if query.from_user.id not in ADMIN_IDS:
+            return
+        
+        duration_type = action['duration']
+        roblox_id = action['roblox_id']
+        reason = action['reason']
+        
+        duration = MUTE_DURATIONS[duration_type]
+        
+        if not await db.add_mute(roblox_id, reason, duration, query.from_user.id):
+            await query.edit_message_text(f"❌ Не удалось замутить Roblox ID {roblox_id}: ошибка записи в базу.")
+            return
+        expiry_scheduler.schedule('mute', roblox_id, db.cache.get_expiry('mute', int(roblox_id)))
+        await sanctions.apply('mute', roblox_id)
+        
+        await query.edit_message_text(
+            f"✅ **Пользователь замучен**\n\n"
+            f"• Roblox ID: {roblox_id}\n"
+            f"• Причина: {reason}\n"
+            f"• Длительность: на {duration_type}\n"
+            f"• Замутил: {query.from_user.first_name}"
+        )
+    except Exception as e:
+        logger.error(f"Error in execute_mute: {e}")
+
+# Массовая модерация
+BULK_SEPARATORS = re.compile(r'[\s,;]+')
+# Как часто обновлять отчет о применении ограничений (секунды)
+BULK_PROGRESS_INTERVAL = 5
+# Сколько некорректных ID показать в ответе
+BULK_INVALID_SHOWN = 10
+
+def parse_bulk_ids(text):
+    """'123, 456\n12a3' -> ([123, 456], ['12a3'])"""
+    roblox_ids, invalid = [], []
+    for token in BULK_SEPARATORS.split(text):
+        if not token:
+            continue
+        if token.isascii() and token.isdigit() and int(token) > 0:
+            roblox_ids.append(int(token))
+        else:
+            invalid.append(token)
+    return roblox_ids, invalid
+
+def parse_bulk_command(text):
+    """Первая строка - команда, срок и причина; ID - в следующих строках
+
+    '/bulk_ban 1d Рейд 2024\n123, 456\n12a3' -> ('1d', 'Рейд 2024', [123, 456], ['12a3'])
+    """
+    header, _, body = text.partition('\n')
+    parts = header.split(maxsplit=2)[1:]
+    duration_type = parts[0] if parts else None
+    reason = parts[1].strip() if len(parts) > 1 else ''
+    roblox_ids, invalid = parse_bulk_ids(body)
+    return duration_type, reason, roblox_ids, invalid
+
+def describe_invalid_ids(invalid):
+    """Строка отчета о некорректных ID (пустая, если их нет)"""
+    if not invalid:
+        return ''
+    shown = ', '.join(invalid[:BULK_INVALID_SHOWN])
+    more = f" и еще {len(invalid) - BULK_INVALID_SHOWN}" if len(invalid) > BULK_INVALID_SHOWN else ''
+    return f"• Некорректные ID ({len(invalid)}, пропущены): {shown}{more}\n"
+
+async def bulk_sanction(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Массовый бан или мут: ID в строках после команды или в файле .txt/.csv с командой в подписи"""
+    try:
+        message = update.message
+        
+        if update.effective_user.id not in ADMIN_IDS:
+            await message.reply_text("❌ У вас нет доступа к этой команде.")
+            return
+        
+        text = message.text or message.caption or ''
+        kind = 'ban' if text.split(maxsplit=1)[0].split('@')[0] == '/bulk_ban' else 'mute'
+        durations = BAN_DURATIONS if kind == 'ban' else MUTE_DURATIONS
+        duration_type, reason, roblox_ids, invalid = parse_bulk_command(text)
+        
+        if message.document:
+            if (message.document.file_size or 0) > BULK_MAX_FILE_SIZE:
+                await message.reply_text(f"❌ Файл больше {BULK_MAX_FILE_SIZE // 1024} КБ.")
+                return
+            file = await message.document.get_file()
+            content = (await file.download_as_bytearray()).decode('utf-8', errors='ignore')
+            file_ids, file_invalid = parse_bulk_ids(content)
+            roblox_ids += file_ids
+            invalid += file_invalid
+        
+        roblox_ids = list(dict.fromkeys(roblox_ids))
+        if duration_type not in durations or not roblox_ids:
+            await message.reply_text(
+                f"Использование: /bulk_{kind} <срок> <причина>\n"
+                f"<ID через пробел, запятую или с новой строки>\n\n"
+                f"ID пишутся со второй строки сообщения или в файле .txt/.csv "
+                f"с командой в подписи.\n"
+                f"Сроки: {', '.join(durations)}\n"
+                f"{describe_invalid_ids(invalid)}"
+            )
+            return
+        if len(roblox_ids) > BULK_MAX_IDS:
+            await message.reply_text(f"❌ Слишком много ID: {len(roblox_ids)} (максимум {BULK_MAX_IDS}).")
+            return
+        
+        status = await message.reply_text(f"⏳ Проверка {len(roblox_ids)} ID в Roblox...")
+        
+        # Запросы собираются BatchedRobloxAPI в пачки по ROBLOX_BATCH_SIZE
+        results = await asyncio.gather(*(roblox.get_user(roblox_id) for roblox_id in roblox_ids))
+        valid = [roblox_id for roblox_id, (found, _) in zip(roblox_ids, results) if found]
+        not_found = sum(1 for found, _ in results if found is False)
+        unchecked = len(roblox_ids) - len(valid) - not_found
+        
+        saved = 0
+        if valid:
+            saved = await db.add_sanctions_bulk(
+                kind, valid, reason or "Не указана", durations[duration_type],
+                message.from_user.id, duration_type == 'permanent'
+            )
+        
+        futures = []
+        if saved:
+            for roblox_id in valid:
+                expiry_scheduler.schedule(kind, roblox_id, db.cache.get_expiry(kind, roblox_id))
+            futures = await sanctions.apply_many(kind, valid)
+        
+        action = "Массовый бан" if kind == 'ban' else "Массовый мут"
+        report = (
+            f"✅ {action} ({duration_type})\n\n"
+            f"• Получено ID: {len(roblox_ids)}\n"
+            f"{describe_invalid_ids(invalid)}"
+            f"• Не найдено в Roblox: {not_found}\n"
+            f"• Не удалось проверить: {unchecked}\n"
+            f"• Сохранено: {saved}\n"
+        )
+        if valid and not saved:
+            report += "❌ Ошибка записи в базу, санкции не применены.\n"
+        
+        # Ограничения в группах идут через лимиты Broadcaster и могут занять
+        # минуты, поэтому отчет дописывается в фоне, не занимая обработчик
+        context.application.create_task(report_bulk_progress(status, report, futures))
+    except Exception as e:
+        logger.error(f"Error in bulk_sanction: {e}")
+
+async def report_bulk_progress(status, report, futures):
+    """Обновлять отчет по мере применения ограничений в группах"""
+    try:
+        applied = failed = 0
+        pending = set(futures)
+        while True:
+            suffix = f"• Ограничения в группах: {applied} применено, {failed} ошибок"
+            if pending:
+                suffix += f", {len(pending)} в очереди ⏳"
+            await status.edit_text(report + suffix)
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, timeout=BULK_PROGRESS_INTERVAL)
+            for future in done:
+                if future.result():
+                    applied += 1
+                else:
+                    failed += 1
+    except Exception as e:
+        logger.error(f"Error in report_bulk_progress: {e}")
+
 # Обработчики для групп
 async def add_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Добавление группы в БД"""
@@ -455,45 +811,153 @@ async def add_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
         group_id = update.effective_chat.id
         group_title = update.effective_chat.title
         
-        db.add_group(group_id, group_title, update.effective_user.id)
+        await db.add_group(group_id, group_title, update.effective_user.id)
         
         await update.message.reply_text("✅ Группа добавлена в систему модерации!")
     except Exception as e:
         logger.error(f"Error in add_group: {e}")
 
-async def main():
-    """Основная функция для bothost"""
+def build_application(polling=True):
+    """Создать Application и зарегистрировать обработчики"""
+    # Создаем Application с более стабильными настройками для хостинга
+    # Обновления разных чатов обрабатываются параллельно, одного чата - по порядку
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(TELEGRAM_API_URL)
+        # Учет вызовов Bot API для /metrics (размер пула как у PTB по умолчанию)
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .concurrent_updates(ChatOrderedUpdateProcessor(UPDATE_WORKERS))
+        # Шаг авторизации и admin_action переживают перезапуск бота
+        .persistence(SQLitePersistence(
+            db,
+            flush_interval=PERSISTENCE_FLUSH_INTERVAL,
+            update_interval=PERSISTENCE_UPDATE_INTERVAL
+        ))
+    )
+    if not polling:
+        builder = builder.updater(None)
+    application = builder.build()
+    # Общий лимит на тяжелые админские операции
+    admin_limit = ConcurrencyLimit(ADMIN_HANDLER_CONCURRENCY)
+    
+    # Обработчики команд
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("profile", show_profile))
+    application.add_handler(CommandHandler("admin", admin_limit(admin_panel)))
+    application.add_handler(CommandHandler("add_group", admin_limit(add_group)))
+    application.add_handler(CommandHandler(["bulk_ban", "bulk_mute"], admin_limit(bulk_sanction)))
+    application.add_handler(MessageHandler(
+        filters.Document.ALL & filters.CaptionRegex(r'^/bulk_(ban|mute)\b'), admin_limit(bulk_sanction)
+    ))
+    
+    # Обработчики callback-запросов: один обработчик, выбор по таблице
+    callbacks.on("start_auth", track_handler(start_auth))
+    callbacks.on("check_verification", track_handler(check_verification))
+    callbacks.on("new_code", track_handler(new_code))
+    callbacks.on("admin_panel", track_handler(admin_limit(admin_panel)))
+    callbacks.on("admin_ban", track_handler(admin_limit(ban_user)))
+    callbacks.on("admin_mute", track_handler(admin_limit(mute_user)))
+    callbacks.action("ban", track_handler(admin_limit(execute_ban)))
+    callbacks.action("mute", track_handler(admin_limit(execute_mute)))
+    application.add_handler(CallbackQueryHandler(callbacks.dispatch))
+    
+    # Обработчики сообщений
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    # Отдельная группа: в одной группе сработал бы только первый обработчик
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_admin_action), group=1)
+    
+    # Время каждого обработчика и глубина очередей для /metrics
+    instrument_application(application)
+    QUEUE_DEPTH.set_function(application.update_queue.qsize, 'updates')
+    QUEUE_DEPTH.set_function(broadcaster.pending_count, 'broadcast')
+    QUEUE_DEPTH.set_function(verification_poller.pending_count, 'verification')
+    QUEUE_DEPTH.set_function(db.pending_writes, 'db_writes')
+    return application
+
+async def initialize(application, timer=None):
+    """Подготовить БД и Application
+
+    Сначала миграции, затем параллельно application.initialize() (getMe,
+    загрузка persistence) и загрузка кэша модерации одним проходом.
+    """
+    await db.open()
+    if timer is not None:
+        timer.mark('database')
+    await asyncio.gather(application.initialize(), db.warm_up())
+    if timer is not None:
+        timer.mark('initialize')
+
+metrics_server = None
+
+async def start_services(application, singletons=True, metrics_port=METRICS_PORT):
+    """Запустить фоновые службы
+
+    singletons=False - для дополнительных процессов при шардировании:
+    снятие санкций по сроку и восстановление отложенных удалений
+    выполняет только один процесс. metrics_port=0 - без /metrics.
+    """
+    global metrics_server
+    if metrics_port:
+        metrics_server = MetricsServer(METRICS_LISTEN, metrics_port)
+        await metrics_server.start()
+    broadcaster.start(application.bot)
+    verification_poller.start(application.bot)
+    if singletons:
+        await expiry_scheduler.start()
+    await delayed_actions.start(application.bot, restore=singletons)
+
+async def stop_services():
+    if metrics_server is not None:
+        await metrics_server.stop()
+    await delayed_actions.stop()
+    await expiry_scheduler.stop()
+    await verification_poller.stop()
+    await broadcaster.stop()
+    await roblox.close()
+    # Последним: службы выше могли поставить записи в очередь при остановке
+    await db.flush()
+
+async def main(started=None):
+    """Основная функция для bothost
+
+    started - момент начала запуска (perf_counter) для отчета о фазах,
+    по умолчанию - вызов main().
+    """
+    timer = StartupTimer(started)
+    timer.mark('import')
+    application = None
+    webhook_server = None
     try:
-        # Создаем Application с более стабильными настройками для хостинга
-        application = Application.builder().token(BOT_TOKEN).build()
-        
-        # Обработчики команд
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("profile", show_profile))
-        application.add_handler(CommandHandler("admin", admin_panel))
-        application.add_handler(CommandHandler("add_group", add_group))
-        
-        # Обработчики callback-запросов
-        application.add_handler(CallbackQueryHandler(start_auth, pattern="^start_auth$"))
-        application.add_handler(CallbackQueryHandler(check_verification, pattern="^check_verification$"))
-        application.add_handler(CallbackQueryHandler(new_code, pattern="^new_code$"))
-        application.add_handler(CallbackQueryHandler(admin_panel, pattern="^admin_panel$"))
-        application.add_handler(CallbackQueryHandler(ban_user, pattern="^admin_ban$"))
-        application.add_handler(CallbackQueryHandler(execute_ban, pattern="^ban_"))
-        
-        # Обработчики сообщений
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_admin_action))
+        application = build_application()
+        timer.mark('build')
         
         # Запуск бота с обработкой ошибок
         logger.info("Бот запускается на bothost...")
-        await application.initialize()
+        await initialize(application, timer)
         await application.start()
-        await application.updater.start_polling(
-            allowed_updates=Update.ALL_TYPES,
-            timeout=30,
-            poll_interval=1.0
-        )
+        if BOT_MODE == 'webhook':
+            from webhook import WebhookServer
+            # Обновления приходят на встроенный сервер и сразу попадают в update_queue
+            webhook_server = WebhookServer(
+                application,
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                path=WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                webhook_url=WEBHOOK_URL
+            )
+            await webhook_server.start()
+        else:
+            await application.updater.start_polling(
+                allowed_updates=Update.ALL_TYPES,
+                timeout=30,
+                poll_interval=1.0
+            )
+        timer.mark('start')
+        await start_services(application)
+        timer.mark('services')
+        timer.report()
         
         # Бесконечный цикл для поддержания работы
         while True:
@@ -502,6 +966,15 @@ async def main():
     except Exception as e:
         logger.error(f"Fatal error in main: {e}")
         raise
+    finally:
+        if webhook_server is not None:
+            await webhook_server.stop()
+        if application is not None and application.running:
+            if application.updater and application.updater.running:
+                await application.updater.stop()
+            await application.stop()
+            await application.shutdown()
+        await stop_services()
 
 if __name__ == '__main__':
     # Для локального тестирования
@@ -0,0 +1,173 @@
+import asyncio
+import itertools
+import time
+import logging
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Ограничитель частоты: rate токенов в секунду, запас capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Забрать токен и вернуть, сколько секунд нужно подождать"""
+        self._refill()
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def delay(self, seconds):
+        """Запретить выдачу токенов на seconds секунд (flood wait)"""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    def is_idle(self):
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class Broadcaster:
+    """Очередь рассылки вызовов Bot API по многим чатам
+
+    Вызовы выполняют concurrency рабочих задач; общий token bucket держит
+    глобальный лимит Telegram, отдельные bucket'ы - лимит на каждый чат.
+    Баны и ограничения идут вне очереди перед рассылками. Вызов, которому
+    надо ждать bucket своего чата, бронирует место и возвращается в очередь
+    по таймеру - рабочая задача тем временем выполняет другие вызовы.
+    RetryAfter возвращает вызов в очередь не раньше чем через указанное
+    время (до max_retries раз), для отправки сообщений откладывается весь
+    чат. Отправка не блокирует вызывающий обработчик.
+    """
+
+    MAX_CHAT_BUCKETS = 10000
+    # Лимит на чат у Telegram касается отправки сообщений, а не модерации
+    CHAT_LIMITED_METHODS = {'send_message', 'send_photo', 'send_document'}
+    # Применение и снятие санкций не ждет за рассылками (меньше - раньше)
+    MODERATION_METHODS = {'ban_chat_member', 'unban_chat_member', 'restrict_chat_member'}
+    PRIORITY_MODERATION = 0
+    PRIORITY_DEFAULT = 1
+
+    def __init__(self, concurrency=8, global_rate=25, chat_rate=0.33, max_retries=3):
+        self.concurrency = concurrency
+        self.chat_rate = chat_rate
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate)
+        self._chats = {}  # chat_id -> TokenBucket
+        self._queue = None
+        self._workers = []
+        self._deferred = set()  # таймеры отложенных вызовов
+        self._sequence = itertools.count()  # порядок внутри одного приоритета
+        self._bot = None
+
+    def start(self, bot):
+        self._bot = bot
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for handle in self._deferred:
+            handle.cancel()
+        pending = self.pending_count()
+        self._deferred.clear()
+        if pending:
+            logger.warning(f"Broadcaster stopped with {pending} pending calls")
+
+    def pending_count(self):
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return queued + len(self._deferred)
+
+    def submit(self, chat_id, method, **kwargs):
+        """Поставить вызов bot.<method>(chat_id=chat_id, **kwargs) в очередь
+
+        Возвращает future с результатом True/False; ждать его не обязательно.
+        """
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        future = asyncio.get_running_loop().create_future()
+        self._put((chat_id, method, kwargs, 0, future, False))
+        return future
+
+    def broadcast(self, chat_ids, text, **kwargs):
+        """Разослать сообщение в несколько чатов, вернуть список future"""
+        return [self.submit(chat_id, 'send_message', text=text, **kwargs) for chat_id in chat_ids]
+
+    def _put(self, call):
+        """call: (chat_id, method, kwargs, попытка, future, место в bucket чата уже занято)"""
+        priority = self.PRIORITY_MODERATION if call[1] in self.MODERATION_METHODS else self.PRIORITY_DEFAULT
+        self._queue.put_nowait((priority, next(self._sequence), call))
+
+    def _defer(self, call, delay):
+        """Вернуть вызов в очередь через delay секунд, не занимая рабочую задачу"""
+        def put():
+            self._deferred.discard(handle)
+            self._put(call)
+        handle = asyncio.get_running_loop().call_later(delay, put)
+        self._deferred.add(handle)
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.MAX_CHAT_BUCKETS:
+                self._chats = {key: b for key, b in self._chats.items() if not b.is_idle()}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, capacity=1)
+        return bucket
+
+    async def _worker(self):
+        while True:
+            _, _, call = await self._queue.get()
+            chat_id, method, kwargs, attempt, future, reserved = call
+            try:
+                if method in self.CHAT_LIMITED_METHODS and not reserved:
+                    wait = self._chat_bucket(chat_id).reserve()
+                    if wait > 0:
+                        # Место в bucket чата забронировано - вернуться к нему в срок
+                        self._defer((chat_id, method, kwargs, attempt, future, True), wait)
+                        continue
+                await self._global.acquire()
+                await getattr(self._bot, method)(chat_id=chat_id, **kwargs)
+                if not future.done():
+                    future.set_result(True)
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                logger.warning(f"Flood wait {retry_after}s for chat {chat_id} ({method})")
+                if attempt < self.max_retries:
+                    retry = (chat_id, method, kwargs, attempt + 1, future, False)
+                    if method in self.CHAT_LIMITED_METHODS:
+                        # Bucket чата отложен - повтор забронирует место после паузы
+                        self._chat_bucket(chat_id).delay(retry_after)
+                        self._put(retry)
+                    else:
+                        self._defer(retry, retry_after)
+                elif not future.done():
+                    future.set_result(False)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                logger.error(f"Error in {method} for chat {chat_id}: {e}")
+                if not future.done():
+                    future.set_result(False)
+            finally:
+                self._queue.task_done()
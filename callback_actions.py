@@ -0,0 +1,95 @@
+import json
+import logging
+import secrets
+import time
+from roblox_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackRegistry:
+    """Реестр действий inline-кнопок
+
+    Кнопка несет в callback_data либо статическое имя ('admin_ban'), либо
+    короткий непрозрачный токен ('~' + 8 символов). Параметры действия
+    (roblox_id, причина, срок) хранятся на сервере: в памяти в ограниченном
+    TTL-кэше и в SQLite на случай вытеснения из кэша или перезапуска.
+    Разбор callback_data сводится к одному поиску в словаре, а все кнопки
+    обслуживает один CallbackQueryHandler.
+    """
+
+    TOKEN_PREFIX = '~'
+
+    def __init__(self, db=None, maxsize=10000, ttl=86400):
+        self.db = db
+        self.ttl = ttl
+        self._static = {}    # callback_data -> handler(update, context)
+        self._actions = {}   # action -> handler(update, context, payload)
+        self._pending = TTLCache(maxsize)  # token -> (action, payload)
+
+    def on(self, callback_data, handler):
+        """Обработчик кнопки со статическим callback_data"""
+        self._static[callback_data] = handler
+
+    def action(self, name, handler):
+        """Обработчик действия, создаваемого через create/create_many"""
+        self._actions[name] = handler
+
+    async def create(self, action, **payload):
+        """Сохранить действие и вернуть токен для callback_data"""
+        return (await self.create_many([(action, payload)]))[0]
+
+    async def create_many(self, items):
+        """Токены для набора кнопок одной клавиатуры (одна запись в БД)
+
+        items: список (action, payload)
+        """
+        expires_at = time.time() + self.ttl
+        tokens, rows = [], []
+        for action, payload in items:
+            token = self.TOKEN_PREFIX + secrets.token_urlsafe(6)
+            self._pending.set(token, (action, payload), self.ttl)
+            tokens.append(token)
+            rows.append((token, action, json.dumps(payload), expires_at))
+        if self.db is not None:
+            # Токены уже в памяти, БД нужна только как запасной вариант
+            await self.db.save_callback_actions(rows, durable=False)
+        return tokens
+
+    async def resolve(self, token):
+        """(action, payload) по токену или None, если кнопка устарела"""
+        cached = self._pending.get(token)
+        if cached is not None:
+            return cached[0]
+        if self.db is None:
+            return None
+        row = await self.db.get_callback_action(token)
+        if row is None:
+            return None
+        action, payload, expires_at = row
+        entry = (action, json.loads(payload))
+        self._pending.set(token, entry, max(expires_at - time.time(), 0))
+        return entry
+
+    async def dispatch(self, update, context):
+        """Единая точка входа для всех callback_query"""
+        query = update.callback_query
+        data = query.data or ''
+
+        handler = self._static.get(data)
+        if handler is not None:
+            return await handler(update, context)
+
+        if data.startswith(self.TOKEN_PREFIX):
+            entry = await self.resolve(data)
+            if entry is not None:
+                action, payload = entry
+                handler = self._actions.get(action)
+                if handler is not None:
+                    return await handler(update, context, payload)
+            else:
+                await query.answer("⌛ Кнопка устарела, повторите действие.", show_alert=True)
+                return
+
+        logger.warning(f"Unknown callback data: {data!r}")
+        await query.answer()
@@ -4,8 +4,113 @@ from dotenv import load_dotenv
 load_dotenv()
 
 BOT_TOKEN = os.getenv('BOT_TOKEN')
+# Адрес Bot API (можно подменить на локальный стаб, см. benchmark.py)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
 ADMIN_IDS = list(map(int, os.getenv('ADMIN_IDS', '').split(','))) if os.getenv('ADMIN_IDS') else []
 
+# Режим получения обновлений: 'polling' или 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # публичный адрес; если не задан, webhook в Telegram не регистрируется
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+# Секрет заголовка X-Telegram-Bot-Api-Secret-Token; обязателен, если WEBHOOK_URL не задан,
+# иначе без него генерируется новый при каждом запуске
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+
+# Перезапуск после падения: задержка растет от RESTART_MIN_DELAY до RESTART_MAX_DELAY (с)
+# со случайным разбросом и сбрасывается, если бот проработал RESTART_RESET_AFTER секунд
+RESTART_MIN_DELAY = float(os.getenv('RESTART_MIN_DELAY', '1'))
+RESTART_MAX_DELAY = float(os.getenv('RESTART_MAX_DELAY', '60'))
+RESTART_RESET_AFTER = float(os.getenv('RESTART_RESET_AFTER', '300'))
+
+# Параллельная обработка обновлений и лимит на админские операции
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '64'))
+ADMIN_HANDLER_CONCURRENCY = int(os.getenv('ADMIN_HANDLER_CONCURRENCY', '2'))
+
+# Число процессов-обработчиков; больше 1 - шардированный режим через webhook
+SHARD_COUNT = max(int(os.getenv('SHARD_COUNT', '1')), 1)
+
+# Сохранение user_data: как часто Application отдает изменения и задержка пакетной записи (с)
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv('PERSISTENCE_UPDATE_INTERVAL', '5'))
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv('PERSISTENCE_FLUSH_INTERVAL', '1'))
+
+# Действия inline-кнопок: сколько держать в памяти и срок жизни кнопки (с)
+CALLBACK_CACHE_SIZE = int(os.getenv('CALLBACK_CACHE_SIZE', '10000'))
+CALLBACK_TTL = int(os.getenv('CALLBACK_TTL', '86400'))
+
+# Массовые баны и муты: максимум ID за одну команду и размер файла со списком (байты)
+BULK_MAX_IDS = int(os.getenv('BULK_MAX_IDS', '5000'))
+BULK_MAX_FILE_SIZE = int(os.getenv('BULK_MAX_FILE_SIZE', '1048576'))
+
+# Метрики в формате Prometheus: GET /metrics на METRICS_LISTEN:METRICS_PORT
+# (0 - отключить; при шардировании процесс i слушает METRICS_PORT + i)
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))
+
+# Потоки для чтения из SQLite (запись всегда идет через один поток)
+DB_READ_WORKERS = int(os.getenv('DB_READ_WORKERS', '4'))
+# Записи объединяются в одну транзакцию: ожидание пачки (с) и ее максимальный размер
+DB_BATCH_DELAY = float(os.getenv('DB_BATCH_DELAY', '0.005'))
+DB_BATCH_SIZE = int(os.getenv('DB_BATCH_SIZE', '100'))
+
+# Клиент Roblox API (адреса можно подменить на локальный стаб)
+ROBLOX_LEGACY_URL = os.getenv('ROBLOX_LEGACY_URL', 'https://api.roblox.com')
+ROBLOX_USERS_URL = os.getenv('ROBLOX_USERS_URL', 'https://users.roblox.com')
+ROBLOX_TIMEOUT = float(os.getenv('ROBLOX_TIMEOUT', '10'))
+ROBLOX_MAX_RETRIES = int(os.getenv('ROBLOX_MAX_RETRIES', '2'))
+ROBLOX_BACKOFF = float(os.getenv('ROBLOX_BACKOFF', '0.5'))
+ROBLOX_MAX_CONNECTIONS = int(os.getenv('ROBLOX_MAX_CONNECTIONS', '100'))
+ROBLOX_MAX_PER_HOST = int(os.getenv('ROBLOX_MAX_PER_HOST', '20'))
+
+# Кэш ответов Roblox (секунды)
+ROBLOX_CACHE_SIZE = int(os.getenv('ROBLOX_CACHE_SIZE', '10000'))
+ROBLOX_ID_TTL = int(os.getenv('ROBLOX_ID_TTL', '86400'))
+ROBLOX_NOT_FOUND_TTL = int(os.getenv('ROBLOX_NOT_FOUND_TTL', '60'))
+ROBLOX_DESCRIPTION_TTL = int(os.getenv('ROBLOX_DESCRIPTION_TTL', '30'))
+ROBLOX_RECHECK_COOLDOWN = int(os.getenv('ROBLOX_RECHECK_COOLDOWN', '10'))
+
+# Пакетные запросы к Roblox: окно сбора (секунды) и размер пачки
+ROBLOX_BATCH_WINDOW = float(os.getenv('ROBLOX_BATCH_WINDOW', '0.01'))
+ROBLOX_BATCH_SIZE = int(os.getenv('ROBLOX_BATCH_SIZE', '100'))
+
+# Фоновая проверка кодов верификации (секунды)
+VERIFY_POLL_WORKERS = int(os.getenv('VERIFY_POLL_WORKERS', '4'))
+VERIFY_POLL_INITIAL_DELAY = float(os.getenv('VERIFY_POLL_INITIAL_DELAY', '5'))
+VERIFY_POLL_MAX_DELAY = float(os.getenv('VERIFY_POLL_MAX_DELAY', '120'))
+VERIFY_POLL_DEADLINE = float(os.getenv('VERIFY_POLL_DEADLINE', '900'))
+
+# Рассылки по группам: лимиты Telegram ~30 сообщений/с всего и ~20/мин на группу
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '8'))
+BROADCAST_GLOBAL_RATE = float(os.getenv('BROADCAST_GLOBAL_RATE', '25'))
+BROADCAST_CHAT_RATE = float(os.getenv('BROADCAST_CHAT_RATE', '0.33'))
+BROADCAST_MAX_RETRIES = int(os.getenv('BROADCAST_MAX_RETRIES', '3'))
+
+# Окончание санкций: окно планирования и перенос истекших строк в архив (секунды)
+EXPIRY_HORIZON = int(os.getenv('EXPIRY_HORIZON', '3600'))
+EXPIRY_ARCHIVE_INTERVAL = int(os.getenv('EXPIRY_ARCHIVE_INTERVAL', '60'))
+EXPIRY_ARCHIVE_BATCH = int(os.getenv('EXPIRY_ARCHIVE_BATCH', '500'))
+# Санкции, истекшие раньше чем EXPIRY_GRACE секунд до запуска, не снимаются, а только архивируются
+EXPIRY_GRACE = int(os.getenv('EXPIRY_GRACE', '300'))
+
+# Предупреждения неавторизованным: окно (с), порог сводки по чату, удаление через (с)
+WARNING_WINDOW = int(os.getenv('WARNING_WINDOW', '60'))
+WARNING_AGGREGATE_THRESHOLD = int(os.getenv('WARNING_AGGREGATE_THRESHOLD', '5'))
+WARNING_DELETE_DELAY = int(os.getenv('WARNING_DELETE_DELAY', '10'))
+
+# Антифлуд: не больше FLOOD_MAX_MESSAGES сообщений за FLOOD_WINDOW секунд
+# от одного пользователя в чате, иначе мут на FLOOD_MUTE_DURATION (ключ MUTE_DURATIONS)
+# FLOOD_MAX_MESSAGES=0 отключает проверку
+FLOOD_MAX_MESSAGES = int(os.getenv('FLOOD_MAX_MESSAGES', '8'))
+FLOOD_WINDOW = float(os.getenv('FLOOD_WINDOW', '10'))
+FLOOD_MUTE_DURATION = os.getenv('FLOOD_MUTE_DURATION', '1h')
+FLOOD_MAX_ENTRIES = int(os.getenv('FLOOD_MAX_ENTRIES', '50000'))
+
+# Отложенные удаления: хранить в SQLite, параллельных запросов, размер пачки
+DELAYED_ACTIONS_PERSIST = os.getenv('DELAYED_ACTIONS_PERSIST', '1') == '1'
+DELAYED_ACTIONS_CONCURRENCY = int(os.getenv('DELAYED_ACTIONS_CONCURRENCY', '5'))
+DELAYED_ACTIONS_BATCH = int(os.getenv('DELAYED_ACTIONS_BATCH', '50'))
+
 # Настройки бана и мута
 BAN_DURATIONS = {
     '1h': 3600,
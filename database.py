@@ -1,18 +1,291 @@
 import sqlite3
 import json
+import threading
+import time
 from datetime import datetime, timedelta
 import logging
+from moderation_cache import ModerationCache, FOREVER
 
 logger = logging.getLogger(__name__)
 
+# Настройки соединений: WAL позволяет читать во время записи,
+# synchronous=NORMAL в режиме WAL делает fsync только при checkpoint
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',      # 16 МБ страничного кэша
+    'PRAGMA mmap_size = 268435456',    # 256 МБ отображения в память
+    'PRAGMA temp_store = MEMORY',
+)
+BUSY_TIMEOUT = 30.0
+STATEMENT_CACHE_SIZE = 256
+
+# Миграции схемы: (версия, список SQL). Текущая версия хранится в PRAGMA user_version,
+# таблицы версии 0 создает init_db
+MIGRATIONS = [
+    # 1: сроки банов и мутов - целые unix-секунды вместо ISO-строк
+    (1, [
+        'ALTER TABLE bans RENAME TO bans_old',
+        '''
+        CREATE TABLE bans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            roblox_id INTEGER,
+            reason TEXT,
+            duration INTEGER,
+            banned_by INTEGER,
+            banned_at TEXT,
+            expires_at INTEGER,
+            is_permanent BOOLEAN DEFAULT FALSE,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        '''
+        INSERT INTO bans
+        SELECT id, user_id, roblox_id, reason, duration, banned_by, banned_at,
+               CASE WHEN is_permanent OR expires_at IS NULL THEN NULL
+                    ELSE CAST(strftime('%s', expires_at, 'utc') AS INTEGER) END,
+               is_permanent OR expires_at IS NULL
+        FROM bans_old
+        ''',
+        'DROP TABLE bans_old',
+        'ALTER TABLE mutes RENAME TO mutes_old',
+        '''
+        CREATE TABLE mutes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            roblox_id INTEGER,
+            reason TEXT,
+            duration INTEGER,
+            muted_by INTEGER,
+            muted_at TEXT,
+            expires_at INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        '''
+        INSERT INTO mutes
+        SELECT id, user_id, roblox_id, reason, duration, muted_by, muted_at,
+               CAST(strftime('%s', expires_at, 'utc') AS INTEGER)
+        FROM mutes_old
+        ''',
+        'DROP TABLE mutes_old',
+    ]),
+    # 2: индексы для проверок по roblox_id и выборок по сроку
+    (2, [
+        # Покрывающие индексы для is_banned/is_muted
+        'CREATE INDEX IF NOT EXISTS idx_bans_roblox_expires ON bans (roblox_id, expires_at)',
+        'CREATE INDEX IF NOT EXISTS idx_mutes_roblox_expires ON mutes (roblox_id, expires_at)',
+        # Частичные индексы по срочным санкциям (загрузка кэша, снятие по сроку);
+        # условие индекса не может ссылаться на текущее время, поэтому
+        # "активность" задается отсечкой expires_at > ? в запросе
+        'CREATE INDEX IF NOT EXISTS idx_bans_active ON bans (expires_at, roblox_id) WHERE expires_at IS NOT NULL',
+        'CREATE INDEX IF NOT EXISTS idx_mutes_active ON mutes (expires_at, roblox_id) WHERE expires_at IS NOT NULL',
+        'CREATE INDEX IF NOT EXISTS idx_bans_permanent ON bans (roblox_id) WHERE expires_at IS NULL',
+    ]),
+    # 3: архив истекших санкций, в основных таблицах остаются только активные
+    (3, [
+        '''
+        CREATE TABLE IF NOT EXISTS bans_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            roblox_id INTEGER,
+            reason TEXT,
+            duration INTEGER,
+            banned_by INTEGER,
+            banned_at TEXT,
+            expires_at INTEGER,
+            is_permanent BOOLEAN DEFAULT FALSE,
+            archived_at INTEGER
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS mutes_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            roblox_id INTEGER,
+            reason TEXT,
+            duration INTEGER,
+            muted_by INTEGER,
+            muted_at TEXT,
+            expires_at INTEGER,
+            archived_at INTEGER
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_bans_archive_roblox ON bans_archive (roblox_id)',
+        'CREATE INDEX IF NOT EXISTS idx_mutes_archive_roblox ON mutes_archive (roblox_id)',
+    ]),
+    # 4: отложенные действия (удаление предупреждений), переживают перезапуск
+    (4, [
+        '''
+        CREATE TABLE IF NOT EXISTS delayed_actions (
+            chat_id INTEGER,
+            message_id INTEGER,
+            due_at REAL,
+            PRIMARY KEY (chat_id, message_id)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    # 5: состояние диалогов бота (user_data и т.п.) для BasePersistence
+    (5, [
+        '''
+        CREATE TABLE IF NOT EXISTS persistence (
+            kind TEXT,
+            key TEXT,
+            data TEXT,
+            PRIMARY KEY (kind, key)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    # 6: параметры действий inline-кнопок (callback_data хранит только токен)
+    (6, [
+        '''
+        CREATE TABLE IF NOT EXISTS callback_actions (
+            token TEXT PRIMARY KEY,
+            action TEXT,
+            payload TEXT,
+            expires_at REAL
+        ) WITHOUT ROWID
+        ''',
+    ]),
+]
+
+
+class ConnectionPool:
+    """Долгоживущие соединения SQLite, по одному на поток
+
+    Соединение открывается один раз и переиспользуется, скомпилированные
+    запросы остаются в кэше выражений sqlite3 (cached_statements), поэтому
+    повторный execute того же SQL не компилирует его заново.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def close_all(self):
+        """Закрыть все соединения (при остановке бота)"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.error(f"Error closing connection: {e}")
+        self._local = threading.local()
+
+
 class Database:
+    """Доступ к SQLite
+
+    Конструктор не обращается к диску: схему готовит init_db(), кэш
+    модерации загружает load_moderation_cache() - при запуске бота это
+    делают AsyncDatabase.open() и warm_up().
+    """
+
     def __init__(self, db_path='moderator.db'):
         self.db_path = db_path
-        self.init_db()
+        self.pool = ConnectionPool(db_path)
+        self.cache = ModerationCache()
+        # Вызывается после изменения состояния модерации: on_change(kind, key),
+        # kind='user' - key=telegram_id, kind='roblox' - key=roblox_id
+        self.on_change = None
+        # Состояние пачки записей потока-писателя (см. run_batch)
+        self._batch = threading.local()
     
     def __get_connection(self):
-        """Получить соединение с базой данных"""
-        return sqlite3.connect(self.db_path, check_same_thread=False)
+        """Получить соединение текущего потока из пула"""
+        return self.pool.get()
+
+    def _changed(self, kind, key):
+        # Внутри пачки другие процессы узнают об изменении только после commit
+        changes = getattr(self._batch, 'changes', None)
+        if changes is not None:
+            changes.append((kind, key))
+            return
+        if self.on_change is not None:
+            try:
+                self.on_change(kind, key)
+            except Exception as e:
+                logger.error(f"Error in change listener: {e}")
+
+    def close(self):
+        self.pool.close_all()
+
+    # Транзакции записи: отдельный commit или точка сохранения внутри пачки
+
+    def _begin(self, conn):
+        if getattr(self._batch, 'changes', None) is not None:
+            conn.execute('SAVEPOINT write')
+
+    def _commit(self, conn):
+        if getattr(self._batch, 'changes', None) is not None:
+            conn.execute('RELEASE write')
+        else:
+            conn.commit()
+
+    def _rollback(self, conn):
+        if getattr(self._batch, 'changes', None) is not None:
+            conn.execute('ROLLBACK TO write')
+            conn.execute('RELEASE write')
+        else:
+            conn.rollback()
+
+    def run_batch(self, calls):
+        """Выполнить несколько записей одной транзакцией (один fsync на пачку)
+
+        calls: список (метод, аргументы). Каждая запись идет в своей точке
+        сохранения, так что ошибка одной откатывает только ее. Возвращает
+        список результатов или None, если не удался commit всей пачки.
+        """
+        conn = self.__get_connection()
+        results = []
+        changes = self._batch.changes = []
+        try:
+            conn.execute('BEGIN')
+            for method, args in calls:
+                try:
+                    results.append(method(*args))
+                except Exception as e:
+                    logger.error(f"Error in batched write: {e}")
+                    results.append(None)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error committing write batch: {e}")
+            results = None
+        finally:
+            self._batch.changes = None
+
+        if results is None:
+            # Кэш уже получил изменения откаченной пачки - перечитать из БД
+            self.load_moderation_cache()
+            return None
+        for kind, key in changes:
+            self._changed(kind, key)
+        return results
     
     def init_db(self):
         conn = self.__get_connection()
@@ -75,29 +348,531 @@ class Database:
             ''')
             
             conn.commit()
+            self.migrate()
             logger.info("Database initialized successfully")
         except Exception as e:
+            conn.rollback()
             logger.error(f"Error initializing database: {e}")
+            # Бот не должен работать на частично мигрированной схеме
+            raise
         finally:
-            conn.close()
+            cursor.close()
+
+    def migrate(self):
+        """Применить недостающие миграции, каждую в своей транзакции
+
+        Версия перечитывается под блокировкой записи: несколько процессов
+        могут мигрировать одну базу одновременно, и миграция, которую уже
+        применил другой процесс, пропускается.
+        """
+        conn = self.__get_connection()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+        for target, statements in MIGRATIONS:
+            if target <= version:
+                continue
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                if target <= version:
+                    conn.rollback()
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {target}')
+                conn.commit()
+                logger.info(f"Database migrated to version {target}")
+            except Exception:
+                conn.rollback()
+                raise
     
     def add_user(self, telegram_id, roblox_username, roblox_id, verification_code):
         conn = self.__get_connection()
         cursor = conn.cursor()
         
         try:
+            self._begin(conn)
             cursor.execute('''
                 INSERT OR REPLACE INTO users 
                 (telegram_id, roblox_username, roblox_id, verification_code, created_at)
                 VALUES (?, ?, ?, ?, ?)
             ''', (telegram_id, roblox_username, roblox_id, verification_code, datetime.now().isoformat()))
             
-            conn.commit()
+            self._commit(conn)
+            self.cache.set_user(telegram_id, roblox_id, is_verified=False)
+            self._changed('user', telegram_id)
             return True
         except Exception as e:
+            self._rollback(conn)
             logger.error(f"Error adding user: {e}")
             return False
         finally:
-            conn.close()
+            cursor.close()
     
-    # ... остальные методы остаются такими же, но с добавлением try/except
+    def get_user_by_telegram_id(self, telegram_id):
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('SELECT * FROM users WHERE telegram_id = ?', (telegram_id,))
+            return cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Error getting user: {e}")
+            return None
+        finally:
+            cursor.close()
+
+    def update_verification_code(self, telegram_id, verification_code):
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            self._begin(conn)
+            cursor.execute(
+                'UPDATE users SET verification_code = ? WHERE telegram_id = ?',
+                (verification_code, telegram_id)
+            )
+            self._commit(conn)
+            return True
+        except Exception as e:
+            self._rollback(conn)
+            logger.error(f"Error updating verification code: {e}")
+            return False
+        finally:
+            cursor.close()
+
+    def verify_user(self, roblox_id):
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            self._begin(conn)
+            cursor.execute(
+                'UPDATE users SET is_verified = TRUE, registration_date = ? WHERE roblox_id = ?',
+                (datetime.now().isoformat(), roblox_id)
+            )
+            self._commit(conn)
+            self.cache.set_verified(int(roblox_id))
+            self._changed('roblox', int(roblox_id))
+            return True
+        except Exception as e:
+            self._rollback(conn)
+            logger.error(f"Error verifying user: {e}")
+            return False
+        finally:
+            cursor.close()
+
+    def add_ban(self, roblox_id, reason, duration, banned_by, is_permanent=False):
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            self._begin(conn)
+            roblox_id = int(roblox_id)
+            now = datetime.now()
+            expires_at = None if is_permanent or not duration else int(now.timestamp()) + duration
+
+            cursor.execute('''
+                INSERT INTO bans
+                (user_id, roblox_id, reason, duration, banned_by, banned_at, expires_at, is_permanent)
+                VALUES ((SELECT user_id FROM users WHERE roblox_id = ?), ?, ?, ?, ?, ?, ?, ?)
+            ''', (roblox_id, roblox_id, reason, duration, banned_by, now.isoformat(),
+                  expires_at, expires_at is None))
+
+            self._commit(conn)
+            self.cache.add_ban(roblox_id, expires_at)
+            self._changed('roblox', roblox_id)
+            return True
+        except Exception as e:
+            self._rollback(conn)
+            logger.error(f"Error adding ban: {e}")
+            return False
+        finally:
+            cursor.close()
+
+    def add_mute(self, roblox_id, reason, duration, muted_by):
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            self._begin(conn)
+            roblox_id = int(roblox_id)
+            now = datetime.now()
+            expires_at = int(now.timestamp()) + duration
+
+            cursor.execute('''
+                INSERT INTO mutes
+                (user_id, roblox_id, reason, duration, muted_by, muted_at, expires_at)
+                VALUES ((SELECT user_id FROM users WHERE roblox_id = ?), ?, ?, ?, ?, ?, ?)
+            ''', (roblox_id, roblox_id, reason, duration, muted_by, now.isoformat(), expires_at))
+
+            self._commit(conn)
+            self.cache.add_mute(roblox_id, expires_at)
+            self._changed('roblox', roblox_id)
+            return True
+        except Exception as e:
+            self._rollback(conn)
+            logger.error(f"Error adding mute: {e}")
+            return False
+        finally:
+            cursor.close()
+
+    def add_sanctions_bulk(self, kind, roblox_ids, reason, duration, issued_by, is_permanent=False):
+        """Бан ('ban') или мут ('mute') списка roblox_id одной транзакцией
+
+        Возвращает число добавленных записей (0 при ошибке).
+        """
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            self._begin(conn)
+            roblox_ids = [int(roblox_id) for roblox_id in roblox_ids]
+            now = datetime.now()
+            if kind == 'ban' and (is_permanent or not duration):
+                expires_at = None
+            else:
+                expires_at = int(now.timestamp()) + duration
+
+            if kind == 'ban':
+                cursor.executemany('''
+                    INSERT INTO bans
+                    (user_id, roblox_id, reason, duration, banned_by, banned_at, expires_at, is_permanent)
+                    VALUES ((SELECT user_id FROM users WHERE roblox_id = ?), ?, ?, ?, ?, ?, ?, ?)
+                ''', [(roblox_id, roblox_id, reason, duration, issued_by, now.isoformat(),
+                       expires_at, expires_at is None) for roblox_id in roblox_ids])
+            else:
+                cursor.executemany('''
+                    INSERT INTO mutes
+                    (user_id, roblox_id, reason, duration, muted_by, muted_at, expires_at)
+                    VALUES ((SELECT user_id FROM users WHERE roblox_id = ?), ?, ?, ?, ?, ?, ?)
+                ''', [(roblox_id, roblox_id, reason, duration, issued_by, now.isoformat(), expires_at)
+                      for roblox_id in roblox_ids])
+
+            self._commit(conn)
+            self.cache.add_sanctions(kind, [(roblox_id, expires_at) for roblox_id in roblox_ids])
+            for roblox_id in roblox_ids:
+                self._changed('roblox', roblox_id)
+            return len(roblox_ids)
+        except Exception as e:
+            self._rollback(conn)
+            logger.error(f"Error adding sanctions in bulk: {e}")
+            return 0
+        finally:
+            cursor.close()
+
+    def is_banned(self, roblox_id):
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                SELECT 1 FROM bans
+                WHERE roblox_id = ? AND (expires_at IS NULL OR expires_at > ?)
+                LIMIT 1
+            ''', (roblox_id, int(time.time())))
+            return cursor.fetchone() is not None
+        except Exception as e:
+            logger.error(f"Error checking ban: {e}")
+            return False
+        finally:
+            cursor.close()
+
+    def is_muted(self, roblox_id):
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                SELECT 1 FROM mutes
+                WHERE roblox_id = ? AND expires_at > ?
+                LIMIT 1
+            ''', (roblox_id, int(time.time())))
+            return cursor.fetchone() is not None
+        except Exception as e:
+            logger.error(f"Error checking mute: {e}")
+            return False
+        finally:
+            cursor.close()
+
+    def refresh_cache(self, kind, key):
+        """Перечитать из БД состояние одного пользователя (после изменения в другом процессе)"""
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+        now = int(time.time())
+
+        try:
+            column = 'telegram_id' if kind == 'user' else 'roblox_id'
+            cursor.execute(
+                f'SELECT telegram_id, roblox_id, is_verified FROM users WHERE {column} = ?', (key,)
+            )
+            row = cursor.fetchone()
+            if row is not None:
+                self.cache.set_user(row[0], row[1], bool(row[2]))
+            elif kind == 'user':
+                self.cache.remove_user(key)
+
+            roblox_id = row[1] if row is not None else (key if kind == 'roblox' else None)
+            if roblox_id is None:
+                return True
+            expirations = []
+            for table in ('bans', 'mutes'):
+                cursor.execute(
+                    f'SELECT expires_at FROM {table} WHERE roblox_id = ? AND (expires_at IS NULL OR expires_at > ?)',
+                    (roblox_id, now)
+                )
+                values = [FOREVER if value is None else value for (value,) in cursor.fetchall()]
+                expirations.append(max(values) if values else None)
+            self.cache.set_sanctions(roblox_id, *expirations)
+            return True
+        except Exception as e:
+            logger.error(f"Error refreshing cache: {e}")
+            return False
+        finally:
+            cursor.close()
+
+    def get_upcoming_expirations(self, since, until):
+        """Санкции, истекающие в (since, until]: список (kind, roblox_id, expires_at)"""
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                SELECT 'ban', roblox_id, expires_at FROM bans
+                WHERE expires_at > ? AND expires_at <= ?
+                UNION ALL
+                SELECT 'mute', roblox_id, expires_at FROM mutes
+                WHERE expires_at > ? AND expires_at <= ?
+            ''', (since, until, since, until))
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error getting upcoming expirations: {e}")
+            return []
+        finally:
+            cursor.close()
+
+    def archive_expired(self, batch_size=500):
+        """Перенести истекшие баны и муты в архив пачками по batch_size строк
+
+        Возвращает число перенесенных строк.
+        """
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+        now = int(time.time())
+        moved = 0
+
+        try:
+            for table in ('bans', 'mutes'):
+                while True:
+                    ids = [row[0] for row in cursor.execute(
+                        f'''
+                        SELECT id FROM {table}
+                        WHERE expires_at IS NOT NULL AND expires_at <= ?
+                        ORDER BY expires_at LIMIT ?
+                        ''', (now, batch_size)
+                    )]
+                    if not ids:
+                        break
+                    placeholders = ','.join('?' * len(ids))
+                    cursor.execute(
+                        f'INSERT OR REPLACE INTO {table}_archive SELECT *, ? FROM {table} WHERE id IN ({placeholders})',
+                        (now, *ids)
+                    )
+                    cursor.execute(f'DELETE FROM {table} WHERE id IN ({placeholders})', ids)
+                    conn.commit()
+                    moved += len(ids)
+                    if len(ids) < batch_size:
+                        break
+            return moved
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error archiving expired sanctions: {e}")
+            return moved
+        finally:
+            cursor.close()
+
+    def save_delayed_actions(self, actions):
+        """Сохранить отложенные удаления: список (chat_id, message_id, due_at)"""
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            self._begin(conn)
+            cursor.executemany(
+                'INSERT OR REPLACE INTO delayed_actions (chat_id, message_id, due_at) VALUES (?, ?, ?)',
+                actions
+            )
+            self._commit(conn)
+            return True
+        except Exception as e:
+            self._rollback(conn)
+            logger.error(f"Error saving delayed actions: {e}")
+            return False
+        finally:
+            cursor.close()
+
+    def remove_delayed_actions(self, keys):
+        """Удалить выполненные действия: список (chat_id, message_id)"""
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            self._begin(conn)
+            cursor.executemany('DELETE FROM delayed_actions WHERE chat_id = ? AND message_id = ?', keys)
+            self._commit(conn)
+            return True
+        except Exception as e:
+            self._rollback(conn)
+            logger.error(f"Error removing delayed actions: {e}")
+            return False
+        finally:
+            cursor.close()
+
+    def get_delayed_actions(self):
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('SELECT chat_id, message_id, due_at FROM delayed_actions')
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error getting delayed actions: {e}")
+            return []
+        finally:
+            cursor.close()
+
+    def load_persistence(self):
+        """Все сохраненные записи состояния бота: список (kind, key, data)"""
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('SELECT kind, key, data FROM persistence')
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error loading persistence: {e}")
+            return []
+        finally:
+            cursor.close()
+
+    def save_persistence(self, upserts, deletes):
+        """Записать изменения состояния одной транзакцией
+
+        upserts: список (kind, key, data), deletes: список (kind, key)
+        """
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            self._begin(conn)
+            cursor.executemany('INSERT OR REPLACE INTO persistence (kind, key, data) VALUES (?, ?, ?)', upserts)
+            cursor.executemany('DELETE FROM persistence WHERE kind = ? AND key = ?', deletes)
+            self._commit(conn)
+            return True
+        except Exception as e:
+            self._rollback(conn)
+            logger.error(f"Error saving persistence: {e}")
+            return False
+        finally:
+            cursor.close()
+
+    def save_callback_actions(self, rows):
+        """Сохранить действия кнопок и удалить истекшие одной транзакцией
+
+        rows: список (token, action, payload, expires_at)
+        """
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            self._begin(conn)
+            cursor.execute('DELETE FROM callback_actions WHERE expires_at <= ?', (time.time(),))
+            cursor.executemany(
+                'INSERT OR REPLACE INTO callback_actions (token, action, payload, expires_at) VALUES (?, ?, ?, ?)',
+                rows
+            )
+            self._commit(conn)
+            return True
+        except Exception as e:
+            self._rollback(conn)
+            logger.error(f"Error saving callback actions: {e}")
+            return False
+        finally:
+            cursor.close()
+
+    def get_callback_action(self, token):
+        """(action, payload, expires_at) по токену или None, если нет или истек"""
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                'SELECT action, payload, expires_at FROM callback_actions WHERE token = ? AND expires_at > ?',
+                (token, time.time())
+            )
+            return cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Error getting callback action: {e}")
+            return None
+        finally:
+            cursor.close()
+
+    def add_group(self, group_id, group_title, added_by):
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            self._begin(conn)
+            cursor.execute('''
+                INSERT OR REPLACE INTO groups (group_id, group_title, added_by, added_at)
+                VALUES (?, ?, ?, ?)
+            ''', (group_id, group_title, added_by, datetime.now().isoformat()))
+
+            self._commit(conn)
+            return True
+        except Exception as e:
+            self._rollback(conn)
+            logger.error(f"Error adding group: {e}")
+            return False
+        finally:
+            cursor.close()
+
+    def get_all_groups(self):
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('SELECT * FROM groups')
+            return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error getting groups: {e}")
+            return []
+        finally:
+            cursor.close()
+
+    def load_moderation_cache(self):
+        """Загрузить кэш модерации одним проходом по таблицам"""
+        conn = self.__get_connection()
+        cursor = conn.cursor()
+        now = int(time.time())
+
+        try:
+            users = cursor.execute(
+                'SELECT telegram_id, roblox_id, is_verified FROM users'
+            ).fetchall()
+            bans = cursor.execute('''
+                SELECT roblox_id, expires_at FROM bans WHERE expires_at IS NULL
+                UNION ALL
+                SELECT roblox_id, expires_at FROM bans WHERE expires_at > ?
+            ''', (now,)).fetchall()
+            mutes = cursor.execute(
+                'SELECT roblox_id, expires_at FROM mutes WHERE expires_at > ?', (now,)
+            ).fetchall()
+
+            self.cache.load(users, bans, mutes)
+            return True
+        except Exception as e:
+            logger.error(f"Error loading moderation cache: {e}")
+            return False
+        finally:
+            cursor.close()
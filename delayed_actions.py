@@ -0,0 +1,108 @@
+import asyncio
+import heapq
+import itertools
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DelayedActionScheduler:
+    """Единый планировщик отложенных действий (удаление предупреждений)
+
+    Вместо отдельной спящей задачи на каждое сообщение все действия лежат
+    в одной куче по времени выполнения, их разбирает одна задача: наступившие
+    удаления забираются пачкой до batch_size и выполняются не более чем
+    concurrency запросами к Bot API одновременно.
+
+    Если передана db, действия сохраняются в SQLite (пачкой, а не по одному)
+    и загружаются при старте, так что после перезапуска бота предупреждения
+    все равно будут удалены.
+    """
+
+    def __init__(self, db=None, concurrency=5, batch_size=50):
+        self.db = db
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self._heap = []
+        self._counter = itertools.count()
+        self._unsaved = []  # еще не записанные в БД (chat_id, message_id, due_at)
+        self._wakeup = None
+        self._task = None
+        self._bot = None
+
+    def schedule_delete(self, chat_id, message_id, delay):
+        """Удалить сообщение через delay секунд"""
+        due_at = time.time() + delay
+        heapq.heappush(self._heap, (due_at, next(self._counter), chat_id, message_id))
+        if self.db is not None:
+            self._unsaved.append((chat_id, message_id, due_at))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def pending_count(self):
+        return len(self._heap)
+
+    async def start(self, bot, restore=True):
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        if self.db is not None and restore:
+            restored = await self.db.get_delayed_actions()
+            for chat_id, message_id, due_at in restored:
+                heapq.heappush(self._heap, (due_at, next(self._counter), chat_id, message_id))
+            if restored:
+                logger.info(f"Restored {len(restored)} delayed actions")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._save()
+
+    async def _save(self, durable=True):
+        if self._unsaved:
+            actions, self._unsaved = self._unsaved, []
+            await self.db.save_delayed_actions(actions, durable=durable)
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        while True:
+            try:
+                # В цикле - без ожидания commit, при остановке _save ждет записи
+                await self._save(durable=False)
+
+                self._wakeup.clear()
+                timeout = self._heap[0][0] - time.time() if self._heap else None
+                if timeout is None or timeout > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                now = time.time()
+                due = []
+                while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                    due.append(heapq.heappop(self._heap)[2:])
+
+                await asyncio.gather(*(self._delete(chat_id, message_id, semaphore) for chat_id, message_id in due))
+                if self.db is not None:
+                    await self.db.remove_delayed_actions(due, durable=False)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in delayed action scheduler: {e}")
+                await asyncio.sleep(1)
+
+    async def _delete(self, chat_id, message_id, semaphore):
+        async with semaphore:
+            try:
+                await self._bot.delete_message(chat_id, message_id)
+            except Exception:
+                pass  # Сообщение уже удалено или нет прав
@@ -0,0 +1,119 @@
+import asyncio
+import heapq
+import math
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiryScheduler:
+    """Планировщик окончания банов и мутов на куче
+
+    При старте загружает санкции, истекающие в ближайшие horizon секунд
+    или истекшие не раньше чем grace секунд назад (простой бота), и раз
+    в horizon/2 подгружает следующее окно. Более старые истекшие строки
+    не снимаются (Telegram уже снял ограничение по until_date), а только
+    переносятся в архив. В момент окончания санкции
+    сбрасывает её в кэше и вызывает on_expired(kind, roblox_id), если
+    к этому времени не появилась более поздняя санкция. Раз в
+    archive_interval секунд истекшие строки переносятся в архив пачками.
+    """
+
+    def __init__(self, db, on_expired=None, horizon=3600, archive_interval=60, batch_size=500, grace=300):
+        self.db = db
+        self.cache = db.cache
+        self.on_expired = on_expired
+        self.horizon = horizon
+        self.archive_interval = archive_interval
+        self.batch_size = batch_size
+        self.grace = grace
+        self._heap = []
+        self._scheduled = set()  # (kind, roblox_id, expires_at) уже в куче
+        self._loaded_until = 0
+        self._wakeup = None
+        self._task = None
+
+    def schedule(self, kind, roblox_id, expires_at):
+        """Запланировать окончание санкции (вызывается после add_ban/add_mute)"""
+        if expires_at is None or expires_at == math.inf:
+            return
+        # Дальние сроки подхватит следующая подгрузка окна
+        if expires_at > self._loaded_until:
+            return
+        key = (kind, int(roblox_id), expires_at)
+        if key in self._scheduled:
+            return
+        self._scheduled.add(key)
+        heapq.heappush(self._heap, (expires_at, kind, int(roblox_id)))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        await self._load_window()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _load_window(self):
+        now = int(time.time())
+        # Сроки до _loaded_until уже в куче или запланированы через schedule()
+        since = self._loaded_until or now - self.grace
+        until = now + self.horizon
+        self._loaded_until = until
+        for kind, roblox_id, expires_at in await self.db.get_upcoming_expirations(since, until):
+            self.schedule(kind, roblox_id, expires_at)
+
+    async def _run(self):
+        next_reload = time.time() + self.horizon / 2
+        next_archive = time.time()
+        while True:
+            try:
+                now = time.time()
+                if now >= next_reload:
+                    await self._load_window()
+                    next_reload = now + self.horizon / 2
+                if now >= next_archive:
+                    moved = await self.db.archive_expired(self.batch_size)
+                    if moved:
+                        logger.info(f"Archived {moved} expired sanctions")
+                    next_archive = now + self.archive_interval
+
+                while self._heap and self._heap[0][0] <= now:
+                    expires_at, kind, roblox_id = heapq.heappop(self._heap)
+                    self._scheduled.discard((kind, roblox_id, expires_at))
+                    await self._fire(kind, roblox_id)
+
+                wake_at = min(next_reload, next_archive)
+                if self._heap:
+                    wake_at = min(wake_at, self._heap[0][0])
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), max(wake_at - time.time(), 0))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in expiry scheduler: {e}")
+                await asyncio.sleep(1)
+
+    async def _fire(self, kind, roblox_id):
+        # Проверка через кэш заодно удаляет истекшую запись
+        if self.cache.get_expiry(kind, roblox_id) is not None:
+            return  # за это время выдали новую санкцию, она запланирована отдельно
+        if self.on_expired is None:
+            return
+        try:
+            await self.on_expired(kind, roblox_id)
+        except Exception as e:
+            logger.error(f"Error lifting {kind} for {roblox_id}: {e}")
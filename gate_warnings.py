@@ -0,0 +1,71 @@
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+WARN = 'warn'
+SUMMARY = 'summary'
+
+
+class _ChatWindow:
+    __slots__ = ('started', 'users', 'warned', 'summary_sent')
+
+    def __init__(self, started):
+        self.started = started
+        self.users = set()     # неавторизованные, писавшие в этом окне
+        self.warned = 0        # отдельных предупреждений в этом окне
+        self.summary_sent = False
+
+
+class WarningDebouncer:
+    """Ограничение предупреждений неавторизованным пользователям
+
+    Одно предупреждение на (чат, пользователь) за window секунд; остальные
+    сообщения только удаляются. Если в чате за окно набралось больше
+    aggregate_threshold разных пользователей, вместо отдельных
+    предупреждений отправляется одна сводка на окно.
+    """
+
+    def __init__(self, window=60, aggregate_threshold=5, max_entries=50000):
+        self.window = window
+        self.aggregate_threshold = aggregate_threshold
+        self.max_entries = max_entries
+        self._last_warning = {}  # (chat_id, user_id) -> время предупреждения
+        self._chats = {}         # chat_id -> _ChatWindow
+
+    def register(self, chat_id, user_id):
+        """Учесть сообщение. Вернуть WARN, SUMMARY или None (только удалить)"""
+        now = time.monotonic()
+        chat = self._chats.get(chat_id)
+        if chat is None or now - chat.started >= self.window:
+            chat = self._chats[chat_id] = _ChatWindow(now)
+        chat.users.add(user_id)
+
+        key = (chat_id, user_id)
+        last = self._last_warning.get(key)
+        if last is not None and now - last < self.window:
+            return None
+
+        if self.aggregate_threshold and chat.warned >= self.aggregate_threshold:
+            if chat.summary_sent:
+                return None
+            chat.summary_sent = True
+            return SUMMARY
+
+        if len(self._last_warning) >= self.max_entries:
+            self._evict(now)
+        self._last_warning[key] = now
+        chat.warned += 1
+        return WARN
+
+    def unverified_count(self, chat_id):
+        chat = self._chats.get(chat_id)
+        return len(chat.users) if chat is not None else 0
+
+    def _evict(self, now):
+        self._last_warning = {
+            key: last for key, last in self._last_warning.items() if now - last < self.window
+        }
+        self._chats = {
+            chat_id: chat for chat_id, chat in self._chats.items() if now - chat.started < self.window
+        }
@@ -0,0 +1,233 @@
+import bisect
+import functools
+import logging
+import time
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек (секунды)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    """Счетчик с метками; inc - один поиск в словаре"""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # значения меток -> число
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labels, value in list(self._values.items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    """Гистограмма с метками: счетчики по корзинам, сумма и количество"""
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # значения меток -> [счетчики корзин..., +Inf], сумма, количество
+
+    def observe(self, value, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def total(self):
+        """Число наблюдений по всем меткам"""
+        return sum(series[2] for series in list(self._series.values()))
+
+    def count(self, *labels):
+        """Число наблюдений для одного набора меток"""
+        series = self._series.get(labels)
+        return series[2] if series is not None else 0
+
+    def time(self, *labels):
+        """Декоратор корутины: записать время выполнения"""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - started, *labels)
+            return wrapper
+        return decorator
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in list(self._series.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket
+                names = self.labelnames + ('le',)
+                lines.append(f'{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Gauge:
+    """Значение, которое вычисляется в момент выгрузки (длина очереди и т.п.)"""
+
+    def __init__(self, name, help, labelname='source'):
+        self.name = name
+        self.help = help
+        self.labelname = labelname
+        self._sources = {}  # значение метки -> функция
+
+    def set_function(self, func, source=''):
+        self._sources[source] = func
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        for source, func in list(self._sources.items()):
+            try:
+                value = func()
+            except Exception as e:
+                logger.warning(f"Gauge {self.name} failed: {e}")
+                continue
+            lines.append(f'{self.name}{_labels((self.labelname,) if source else (), (source,))} {value}')
+        return lines
+
+
+class _ErrorCounter(logging.Handler):
+    """Считает записи журнала уровня ERROR и выше по имени логгера"""
+
+    def __init__(self, counter):
+        super().__init__(level=logging.ERROR)
+        self.counter = counter
+
+    def emit(self, record):
+        self.counter.inc(record.name)
+
+
+HANDLER_SECONDS = Histogram('bot_handler_seconds', 'Handler latency', ('handler',))
+DB_SECONDS = Histogram('bot_db_query_seconds', 'SQLite call duration per Database method', ('method',))
+ROBLOX_SECONDS = Histogram('bot_roblox_request_seconds', 'Roblox HTTP request latency', ('endpoint',))
+ROBLOX_RESPONSES = Counter('bot_roblox_responses_total', 'Roblox HTTP responses by status', ('endpoint', 'status'))
+TELEGRAM_SECONDS = Histogram('bot_telegram_request_seconds', 'Telegram Bot API request latency', ('method',))
+TELEGRAM_REQUESTS = Counter('bot_telegram_requests_total', 'Telegram Bot API requests by status', ('method', 'status'))
+TELEGRAM_RETRY_AFTER = Counter('bot_telegram_retry_after_total', 'Telegram flood waits (429)', ('method',))
+ERRORS = Counter('bot_errors_total', 'Log records at ERROR level and above', ('logger',))
+QUEUE_DEPTH = Gauge('bot_queue_depth', 'Pending items in internal queues')
+STARTUP_SECONDS = Gauge('bot_startup_seconds', 'Duration of the last startup by phase', labelname='phase')
+
+REGISTRY = [
+    HANDLER_SECONDS, DB_SECONDS, ROBLOX_SECONDS, ROBLOX_RESPONSES,
+    TELEGRAM_SECONDS, TELEGRAM_REQUESTS, TELEGRAM_RETRY_AFTER, ERRORS, QUEUE_DEPTH, STARTUP_SECONDS,
+]
+
+
+def count_errors():
+    """Считать ошибки в журнале (вызывать после logging.basicConfig)"""
+    logging.getLogger().addHandler(_ErrorCounter(ERRORS))
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def track_handler(callback, name=None):
+    """Обернуть обработчик PTB (и обработчики с доп. аргументами) замером времени"""
+    return HANDLER_SECONDS.time(name or callback.__name__)(callback)
+
+
+def instrument_application(application):
+    """Обернуть замером времени все зарегистрированные обработчики Application"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = track_handler(handler.callback)
+
+
+class StartupTimer:
+    """Время фаз запуска: mark(phase) закрывает фазу, report() пишет итог в журнал"""
+
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self._last = self.started
+        self.phases = {}
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        duration = self.phases[phase] = now - self._last
+        self._last = now
+        STARTUP_SECONDS.set_function(lambda: duration, phase)
+
+    def report(self):
+        total = self._last - self.started
+        STARTUP_SECONDS.set_function(lambda: total, 'total')
+        phases = ', '.join(f'{phase}={duration * 1000:.0f}ms' for phase, duration in self.phases.items())
+        logger.info(f"Startup finished in {total:.2f}s ({phases})")
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest с учетом вызовов Bot API: время, статус, flood wait"""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+            status = code
+            if code == 429:
+                TELEGRAM_RETRY_AFTER.inc(api_method)
+            return code, payload
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - started, api_method)
+            TELEGRAM_REQUESTS.inc(api_method, status)
+
+
+class MetricsServer:
+    """Локальный HTTP-сервер: GET /metrics"""
+
+    def __init__(self, listen='127.0.0.1', port=9100):
+        self.listen = listen
+        self.port = port
+        self._runner = None
+
+    async def handle_metrics(self, request):
+        from aiohttp import web
+        return web.Response(text=render(), content_type='text/plain', charset='utf-8')
+
+    async def start(self):
+        # aiohttp.web нужен только серверам, не импортируем его заранее
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+        logger.info(f"Metrics server listening on {self.listen}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
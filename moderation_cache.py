@@ -0,0 +1,161 @@
+import math
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Срок для перманентных санкций
+FOREVER = math.inf
+
+
+class UserState:
+    """Состояние пользователя для проверки сообщений в группах"""
+    __slots__ = ('roblox_id', 'is_verified')
+
+    def __init__(self, roblox_id, is_verified=False):
+        self.roblox_id = roblox_id
+        self.is_verified = is_verified
+
+
+class ModerationCache:
+    """Резидентный кэш состояния модерации: telegram_id -> (roblox_id, верификация, бан, мут)
+
+    Загружается целиком при старте и обновляется методами Database при записи
+    (write-through). Сроки санкций хранятся как unix-время: истекший бан или мут
+    снимается при первом обращении без запроса к базе.
+
+    В памяти только действующие санкции, история из bans/mutes не грузится,
+    поэтому для пользователя без санкций проверка сообщения - две проверки
+    вхождения в словари (is_sanctioned), сроки смотрятся только у остальных.
+    """
+
+    def __init__(self):
+        self._users = {}      # telegram_id -> UserState
+        self._by_roblox = {}  # roblox_id -> telegram_id
+        self._bans = {}       # roblox_id -> unix-время окончания бана
+        self._mutes = {}      # roblox_id -> unix-время окончания мута
+        self._lock = threading.Lock()
+
+    def load(self, users, bans, mutes):
+        """Полная загрузка состояния
+
+        users: итерируемое (telegram_id, roblox_id, is_verified)
+        bans, mutes: итерируемое (roblox_id, expires_at), expires_at=None - навсегда
+        """
+        now = time.time()
+        user_map, by_roblox, ban_map, mute_map = {}, {}, {}, {}
+
+        for telegram_id, roblox_id, is_verified in users:
+            user_map[telegram_id] = UserState(roblox_id, bool(is_verified))
+            if roblox_id is not None:
+                by_roblox[roblox_id] = telegram_id
+
+        for target, rows in ((ban_map, bans), (mute_map, mutes)):
+            for roblox_id, expires_at in rows:
+                expires_at = FOREVER if expires_at is None else expires_at
+                if expires_at > max(target.get(roblox_id, 0), now):
+                    target[roblox_id] = expires_at
+
+        with self._lock:
+            self._users, self._by_roblox = user_map, by_roblox
+            self._bans, self._mutes = ban_map, mute_map
+
+        logger.info(
+            f"Moderation cache loaded: {len(user_map)} users, "
+            f"{len(ban_map)} bans, {len(mute_map)} mutes"
+        )
+
+    # Чтение (горячий путь проверки сообщений)
+
+    def get_user(self, telegram_id):
+        return self._users.get(telegram_id)
+
+    def get_telegram_id(self, roblox_id):
+        return self._by_roblox.get(roblox_id)
+
+    def get_expiry(self, kind, roblox_id):
+        """Срок активной санкции ('ban' или 'mute') или None"""
+        sanctions = self._bans if kind == 'ban' else self._mutes
+        if not self._check(sanctions, roblox_id):
+            return None
+        return sanctions.get(roblox_id)
+
+    def is_sanctioned(self, roblox_id):
+        """Возможно есть бан или мут (точный ответ - is_banned/is_muted)"""
+        return roblox_id in self._bans or roblox_id in self._mutes
+
+    def is_banned(self, roblox_id):
+        return self._check(self._bans, roblox_id)
+
+    def is_muted(self, roblox_id):
+        return self._check(self._mutes, roblox_id)
+
+    def _check(self, sanctions, roblox_id):
+        expires_at = sanctions.get(roblox_id)
+        if expires_at is None:
+            return False
+        if expires_at > time.time():
+            return True
+        # Санкция истекла - удаляем запись, если её не обновили параллельно
+        with self._lock:
+            if sanctions.get(roblox_id) == expires_at:
+                del sanctions[roblox_id]
+        return False
+
+    # Запись (вызывается из Database после успешного commit)
+
+    def set_user(self, telegram_id, roblox_id, is_verified=False):
+        with self._lock:
+            # INSERT OR REPLACE вытесняет строку с тем же roblox_id
+            previous = self._by_roblox.get(roblox_id)
+            if previous is not None and previous != telegram_id:
+                self._users.pop(previous, None)
+            old = self._users.get(telegram_id)
+            if old is not None and self._by_roblox.get(old.roblox_id) == telegram_id:
+                del self._by_roblox[old.roblox_id]
+            self._users[telegram_id] = UserState(roblox_id, is_verified)
+            self._by_roblox[roblox_id] = telegram_id
+
+    def remove_user(self, telegram_id):
+        with self._lock:
+            old = self._users.pop(telegram_id, None)
+            if old is not None and self._by_roblox.get(old.roblox_id) == telegram_id:
+                del self._by_roblox[old.roblox_id]
+
+    def set_verified(self, roblox_id, is_verified=True):
+        with self._lock:
+            telegram_id = self._by_roblox.get(roblox_id)
+            state = self._users.get(telegram_id)
+            if state is not None:
+                state.is_verified = is_verified
+
+    def add_ban(self, roblox_id, expires_at=None):
+        self._add_sanction(self._bans, roblox_id, expires_at)
+
+    def add_mute(self, roblox_id, expires_at=None):
+        self._add_sanction(self._mutes, roblox_id, expires_at)
+
+    def add_sanctions(self, kind, items):
+        """Добавить пачку санкций одного вида разом: items - (roblox_id, expires_at)"""
+        sanctions = self._bans if kind == 'ban' else self._mutes
+        with self._lock:
+            for roblox_id, expires_at in items:
+                expires_at = FOREVER if expires_at is None else expires_at
+                if expires_at > sanctions.get(roblox_id, 0):
+                    sanctions[roblox_id] = expires_at
+
+    def set_sanctions(self, roblox_id, ban_expires_at, mute_expires_at):
+        """Заменить санкции roblox_id значениями из БД (None - санкции нет)"""
+        with self._lock:
+            for sanctions, expires_at in ((self._bans, ban_expires_at), (self._mutes, mute_expires_at)):
+                if expires_at is None:
+                    sanctions.pop(roblox_id, None)
+                else:
+                    sanctions[roblox_id] = expires_at
+
+    def _add_sanction(self, sanctions, roblox_id, expires_at):
+        expires_at = FOREVER if expires_at is None else expires_at
+        with self._lock:
+            if expires_at > sanctions.get(roblox_id, 0):
+                sanctions[roblox_id] = expires_at
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+
+class SQLitePersistence(BasePersistence):
+    """Хранение user_data, chat_data, bot_data и состояний диалогов в SQLite
+
+    Все состояние держится в памяти и целиком загружается одним запросом
+    при старте. Application сообщает об изменениях через update_*; такие
+    ключи помечаются грязными и записываются одной транзакцией не чаще
+    раза в flush_interval секунд, а не отдельной записью на каждое обновление.
+    Данные сериализуются в JSON. Application помечает user_data и chat_data
+    на каждом обновлении, поэтому ключ, чей JSON совпадает с последним
+    записанным, пропускается - иначе каждое сообщение в группе давало бы
+    запись, а процесс-шард затирал бы состояние, сохраненное другим шардом.
+    """
+
+    def __init__(self, db, flush_interval=1.0, update_interval=5,
+                 store_data=None):
+        super().__init__(
+            store_data=store_data or PersistenceInput(callback_data=False),
+            update_interval=update_interval
+        )
+        self.db = db
+        self.flush_interval = flush_interval
+        self._loaded = False
+        self._user_data = {}
+        self._chat_data = {}
+        self._bot_data = {}
+        self._conversations = {}  # name -> {key: state}
+        self._dirty = set()       # (kind, key)
+        self._saved = {}          # (kind, str(key)) -> последний записанный JSON
+        self._flush_task = None
+
+    async def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        rows = await self.db.load_persistence()
+        for kind, key, data in rows:
+            self._saved[(kind, key)] = data
+            value = json.loads(data)
+            if kind == 'user':
+                self._user_data[int(key)] = value
+            elif kind == 'chat':
+                self._chat_data[int(key)] = value
+            elif kind == 'bot':
+                self._bot_data = value
+            elif kind.startswith('conversation:'):
+                self._conversations.setdefault(kind[len('conversation:'):], {})[tuple(json.loads(key))] = value
+        logger.info(f"Persistence loaded: {len(rows)} records")
+
+    # Загрузка
+
+    async def get_user_data(self):
+        await self._load()
+        return self._user_data
+
+    async def get_chat_data(self):
+        await self._load()
+        return self._chat_data
+
+    async def get_bot_data(self):
+        await self._load()
+        return self._bot_data
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        await self._load()
+        return dict(self._conversations.get(name, {}))
+
+    # Изменения
+
+    async def update_user_data(self, user_id, data):
+        self._user_data[user_id] = data
+        self._mark('user', user_id)
+
+    async def update_chat_data(self, chat_id, data):
+        self._chat_data[chat_id] = data
+        self._mark('chat', chat_id)
+
+    async def update_bot_data(self, data):
+        self._bot_data = data
+        self._mark('bot', 0)
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name, key, new_state):
+        conversation = self._conversations.setdefault(name, {})
+        if new_state is None:
+            conversation.pop(key, None)
+        else:
+            conversation[key] = new_state
+        self._mark(f'conversation:{name}', json.dumps(list(key)))
+
+    async def drop_user_data(self, user_id):
+        self._user_data.pop(user_id, None)
+        self._mark('user', user_id)
+
+    async def drop_chat_data(self, chat_id):
+        self._chat_data.pop(chat_id, None)
+        self._mark('chat', chat_id)
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass  # актуальное состояние и так в памяти
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    # Запись
+
+    def _mark(self, kind, key):
+        self._dirty.add((kind, key))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_interval)
+        await self._write_dirty()
+
+    def _current(self, kind, key):
+        if kind == 'user':
+            return self._user_data.get(key)
+        if kind == 'chat':
+            return self._chat_data.get(key)
+        if kind == 'bot':
+            return self._bot_data
+        return self._conversations.get(kind[len('conversation:'):], {}).get(tuple(json.loads(key)))
+
+    async def _write_dirty(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        upserts, deletes, written = [], [], {}
+        for kind, key in dirty:
+            value = self._current(kind, key)
+            # Пустой словарь не храним - это состояние по умолчанию
+            data = None if value is None or value == {} else json.dumps(value, ensure_ascii=False)
+            saved_key = (kind, str(key))
+            if self._saved.get(saved_key) == data:
+                continue  # помечен, но не изменился
+            written[saved_key] = data
+            if data is None:
+                deletes.append(saved_key)
+            else:
+                upserts.append(saved_key + (data,))
+        if not written:
+            return
+        if not await self.db.save_persistence(upserts, deletes):
+            self._dirty |= dirty  # повторим при следующей записи
+            return
+        for saved_key, data in written.items():
+            if data is None:
+                self._saved.pop(saved_key, None)
+            else:
+                self._saved[saved_key] = data
+
+    async def flush(self):
+        """Вызывается Application при остановке: записать все изменения"""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self._write_dirty()
@@ -0,0 +1,184 @@
+import asyncio
+import random
+import time
+import logging
+import aiohttp
+from metrics import ROBLOX_SECONDS, ROBLOX_RESPONSES
+
+logger = logging.getLogger(__name__)
+
+LEGACY_API_URL = 'https://api.roblox.com'
+USERS_API_URL = 'https://users.roblox.com'
+
+# Статусы, при которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RobloxAPI:
+    """Асинхронный клиент Roblox API
+
+    Использует одну общую ClientSession: соединения держатся открытыми
+    (keep-alive) и переиспользуются, число одновременных соединений
+    ограничено в целом и на каждый хост. Сетевые ошибки, 429 и 5xx
+    повторяются с экспоненциальной задержкой; Retry-After длиннее
+    таймаута запроса не ожидается.
+    """
+
+    def __init__(self, legacy_url=LEGACY_API_URL, users_url=USERS_API_URL, timeout=10,
+                 max_retries=2, backoff=0.5, max_connections=100, max_per_host=20):
+        self.legacy_url = legacy_url.rstrip('/')
+        self.users_url = users_url.rstrip('/')
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self._session = None
+
+    def _get_session(self):
+        # Сессия создается лениво внутри работающего цикла событий
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_per_host,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                raise_for_status=False
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _request(self, endpoint, method, url, **kwargs):
+        """Выполнить запрос с повторами. Возвращает (status, json) или (None, None)
+
+        endpoint - имя вызова для метрик (задержка и статус каждой попытки).
+        """
+        session = self._get_session()
+        for attempt in range(self.max_retries + 1):
+            delay = self.backoff * (2 ** attempt) * (1 + random.random() / 2)
+            started = time.perf_counter()
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    ROBLOX_SECONDS.observe(time.perf_counter() - started, endpoint)
+                    ROBLOX_RESPONSES.inc(endpoint, response.status)
+                    if response.status == 200:
+                        return response.status, await response.json(content_type=None)
+                    if response.status not in RETRY_STATUSES or attempt == self.max_retries:
+                        return response.status, None
+                    retry_after = response.headers.get('Retry-After')
+                    if retry_after and retry_after.isdigit():
+                        # Дольше таймаута запроса не ждем: вызывающий держит
+                        # очередь пользователя и чата, лучше сразу вернуть ошибку
+                        if int(retry_after) > self.timeout.total:
+                            return response.status, None
+                        delay = max(delay, int(retry_after))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                ROBLOX_RESPONSES.inc(endpoint, 'error')
+                if attempt == self.max_retries:
+                    logger.error(f"Roblox API request failed: {method} {url}: {e!r}")
+                    return None, None
+            await asyncio.sleep(delay)
+        return None, None
+
+    async def resolve_username(self, username):
+        """Найти ID по имени. Возвращает (found, user_id)
+
+        found=False - Roblox ответил, что пользователя нет,
+        found=None - ответ не получен (ошибка сети или сервера).
+        """
+        try:
+            status, data = await self._request(
+                'resolve_username', 'GET', f"{self.legacy_url}/users/get-by-username", params={'username': username}
+            )
+            if status == 200:
+                user_id = data.get('Id')
+                return (True, user_id) if user_id else (False, None)
+            elif status in (400, 404):
+                return False, None
+            elif status is not None:
+                logger.warning(f"Roblox API returned status {status} for username {username}")
+        except Exception as e:
+            logger.error(f"Error getting Roblox user ID: {e}")
+        return None, None
+
+    async def get_user_id(self, username):
+        """Получить ID пользователя Roblox по имени"""
+        found, user_id = await self.resolve_username(username)
+        return user_id
+
+    async def resolve_usernames(self, usernames):
+        """Найти ID для списка имен одним запросом
+
+        Возвращает словарь имя в нижнем регистре -> ID (None - не найден)
+        или None, если ответ не получен.
+        """
+        try:
+            status, data = await self._request(
+                'resolve_usernames', 'POST', f"{self.users_url}/v1/usernames/users",
+                json={'usernames': list(usernames), 'excludeBannedUsers': False}
+            )
+            if status == 200:
+                result = {name.lower(): None for name in usernames}
+                for item in data.get('data', []):
+                    result[item['requestedUsername'].lower()] = item['id']
+                return result
+            elif status is not None:
+                logger.warning(f"Roblox API returned status {status} for {len(usernames)} usernames")
+        except Exception as e:
+            logger.error(f"Error resolving Roblox usernames: {e}")
+        return None
+
+    async def get_users(self, user_ids):
+        """Получить данные нескольких пользователей одним запросом
+
+        Возвращает словарь ID -> данные (None - не существует)
+        или None, если ответ не получен.
+        """
+        try:
+            status, data = await self._request(
+                'get_users', 'POST', f"{self.users_url}/v1/users",
+                json={'userIds': [int(user_id) for user_id in user_ids], 'excludeBannedUsers': False}
+            )
+            if status == 200:
+                result = {int(user_id): None for user_id in user_ids}
+                for item in data.get('data', []):
+                    result[item['id']] = item
+                return result
+            elif status is not None:
+                logger.warning(f"Roblox API returned status {status} for {len(user_ids)} user ids")
+        except Exception as e:
+            logger.error(f"Error getting Roblox users: {e}")
+        return None
+
+    async def resolve_description(self, user_id):
+        """Получить описание профиля. Возвращает (found, description)
+
+        found=False - пользователя нет, found=None - ответ не получен
+        (ошибка сети или сервера); в обоих случаях description пустое.
+        """
+        try:
+            status, data = await self._request(
+                'get_user_description', 'GET', f"{self.users_url}/v1/users/{user_id}"
+            )
+            if status == 200:
+                return True, data.get('description', '') or ''
+            elif status in (400, 404):
+                return False, ''
+            elif status is not None:
+                logger.warning(f"Roblox API returned status {status} for user_id {user_id}")
+        except Exception as e:
+            logger.error(f"Error getting Roblox user description: {e}")
+        return None, ''
+
+    async def get_user_description(self, user_id):
+        """Получить описание профиля пользователя Roblox"""
+        found, description = await self.resolve_description(user_id)
+        return description
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Batcher:
+    """Собирает одиночные запросы за короткое окно и выполняет их пачкой
+
+    fetch(keys) получает список ключей и возвращает словарь key -> результат
+    или None при ошибке; в этом случае все ожидающие получают failure.
+    Пачка уходит по истечении window секунд или при наборе max_size ключей.
+    """
+
+    def __init__(self, fetch, window=0.01, max_size=100, failure=None):
+        self._fetch = fetch
+        self.window = window
+        self.max_size = max_size
+        self.failure = failure
+        self._pending = {}  # key -> future
+        self._timer = None
+        self._tasks = set()
+
+    async def get(self, key):
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+            if len(self._pending) >= self.max_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        try:
+            results = await self._fetch(list(batch))
+        except Exception as e:
+            logger.error(f"Error in batched request: {e}")
+            results = None
+        for key, future in batch.items():
+            if future.done():
+                continue
+            if results is None:
+                future.set_result(self.failure)
+            else:
+                future.set_result(results.get(key, self.failure))
+
+
+class BatchedRobloxAPI:
+    """Обертка над RobloxAPI, объединяющая запросы разных обработчиков
+
+    Поиск по имени и проверка существования ID собираются в пачки и уходят
+    одним POST на /v1/usernames/users и /v1/users. Описание профиля
+    пакетный эндпоинт не возвращает, поэтому оно запрашивается по одному.
+    """
+
+    def __init__(self, api, window=0.01, max_size=100):
+        self.api = api
+        self._usernames = Batcher(self._fetch_usernames, window, max_size, failure=(None, None))
+        self._users = Batcher(self._fetch_users, window, max_size, failure=(None, None))
+
+    async def _fetch_usernames(self, keys):
+        result = await self.api.resolve_usernames(keys)
+        if result is None:
+            return None
+        return {key: (True, user_id) if user_id else (False, None) for key, user_id in result.items()}
+
+    async def _fetch_users(self, keys):
+        result = await self.api.get_users(keys)
+        if result is None:
+            return None
+        return {key: (data is not None, data) for key, data in result.items()}
+
+    async def resolve_username(self, username):
+        """Найти ID по имени. Возвращает (found, user_id), как RobloxAPI"""
+        return await self._usernames.get(username.strip().lower())
+
+    async def get_user_id(self, username):
+        found, user_id = await self.resolve_username(username)
+        return user_id
+
+    async def get_user(self, user_id):
+        """Проверить ID. Возвращает (found, data); found=None - ответ не получен"""
+        return await self._users.get(int(user_id))
+
+    async def get_user_description(self, user_id):
+        return await self.api.get_user_description(user_id)
+
+    async def resolve_description(self, user_id):
+        return await self.api.resolve_description(user_id)
+
+    async def close(self):
+        await self.api.close()
@@ -0,0 +1,116 @@
+import asyncio
+import time
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Ограниченный LRU-кэш, у каждой записи свой срок жизни"""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # key -> (expires_at, stored_at, value)
+
+    def get(self, key):
+        """Вернуть (value, age) или None, если записи нет или она истекла"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, stored_at, value = item
+        now = time.monotonic()
+        if expires_at <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value, now - stored_at
+
+    def set(self, key, value, ttl):
+        now = time.monotonic()
+        self._data[key] = (now + ttl, now, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CachedRobloxAPI:
+    """Кэширующая обертка над RobloxAPI
+
+    - username -> id хранится долго, ответ "не найден" - коротко;
+    - одновременные запросы одного ключа объединяются в один HTTP-запрос;
+    - описание профиля кэшируется ненадолго, повторная проверка обходит кэш
+      только если с прошлого запроса прошло не меньше recheck_cooldown секунд.
+    """
+
+    def __init__(self, api, maxsize=10000, id_ttl=86400, not_found_ttl=60,
+                 description_ttl=30, recheck_cooldown=10):
+        self.api = api
+        self.id_ttl = id_ttl
+        self.not_found_ttl = not_found_ttl
+        self.description_ttl = description_ttl
+        self.recheck_cooldown = recheck_cooldown
+        self._ids = TTLCache(maxsize)
+        self._descriptions = TTLCache(maxsize)
+        self._in_flight = {}
+
+    async def _single_flight(self, key, factory):
+        """Выполнить factory() один раз для всех одновременных запросов key"""
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # shield: отмена одного ожидающего не отменяет запрос для остальных
+        return await asyncio.shield(future)
+
+    async def get_user_id(self, username):
+        """Получить ID пользователя Roblox по имени"""
+        key = username.strip().lower()
+        cached = self._ids.get(key)
+        if cached is not None:
+            return cached[0]
+        return await self._single_flight(('id', key), lambda: self._fetch_user_id(key, username))
+
+    async def _fetch_user_id(self, key, username):
+        found, user_id = await self.api.resolve_username(username)
+        if found:
+            self._ids.set(key, user_id, self.id_ttl)
+        elif found is False:
+            self._ids.set(key, None, self.not_found_ttl)
+        # found is None: ошибка сети, не кэшируем
+        return user_id
+
+    async def get_user_description(self, user_id, recheck=False):
+        """Получить описание профиля
+
+        recheck=True - пользователь явно просит перепроверку; кэш обходится,
+        если с момента прошлого запроса прошло больше recheck_cooldown.
+        """
+        cached = self._descriptions.get(user_id)
+        if cached is not None:
+            description, age = cached
+            if not recheck or age < self.recheck_cooldown:
+                return description
+        return await self._single_flight(('description', user_id), lambda: self._fetch_description(user_id))
+
+    async def _fetch_description(self, user_id):
+        found, description = await self.api.resolve_description(user_id)
+        # found is None: ошибка сети или сервера, не кэшируем - иначе код,
+        # уже добавленный в профиль, не был бы виден до истечения TTL
+        if found is not None:
+            self._descriptions.set(user_id, description, self.description_ttl)
+        return description
+
+    async def get_user(self, user_id):
+        """Проверить существование ID (пакетно, без кэширования)"""
+        return await self.api.get_user(user_id)
+
+    async def close(self):
+        await self.api.close()
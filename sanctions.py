@@ -0,0 +1,92 @@
+import logging
+import math
+from telegram import ChatPermissions
+
+logger = logging.getLogger(__name__)
+
+
+class SanctionEnforcer:
+    """Применение банов и мутов средствами Telegram во всех группах
+
+    Бан - ban_chat_member, мут - restrict_chat_member без прав, оба с until_date,
+    так что Telegram сам снимает ограничение по сроку и сообщения нарушителя
+    до бота не доходят. Вызовы идут через общий Broadcaster с его лимитами.
+    Удаление сообщений в handle_message остается запасным вариантом для
+    групп, где применить ограничение не удалось.
+    """
+
+    MAX_FALLBACK_ENTRIES = 10000
+
+    def __init__(self, db, broadcaster):
+        self.db = db
+        self.cache = db.cache
+        self.broadcaster = broadcaster
+        self._fallback = {}  # (chat_id, telegram_id, kind) -> expires_at, уже повторяли
+
+    def _call(self, chat_id, telegram_id, kind, expires_at, lift=False):
+        until_date = None if expires_at in (None, math.inf) else int(expires_at)
+        if kind == 'ban':
+            if lift:
+                return self.broadcaster.submit(chat_id, 'unban_chat_member', user_id=telegram_id, only_if_banned=True)
+            return self.broadcaster.submit(chat_id, 'ban_chat_member', user_id=telegram_id, until_date=until_date)
+        if lift:
+            return self.broadcaster.submit(
+                chat_id, 'restrict_chat_member',
+                user_id=telegram_id, permissions=ChatPermissions.all_permissions()
+            )
+        return self.broadcaster.submit(
+            chat_id, 'restrict_chat_member',
+            user_id=telegram_id, permissions=ChatPermissions.no_permissions(), until_date=until_date
+        )
+
+    async def apply(self, kind, roblox_id):
+        """Применить активную санкцию ко всем группам; вернуть список future"""
+        telegram_id = self.cache.get_telegram_id(int(roblox_id))
+        expires_at = self.cache.get_expiry(kind, int(roblox_id))
+        if telegram_id is None or expires_at is None:
+            return []
+        groups = await self.db.get_all_groups()
+        return [self._call(group[0], telegram_id, kind, expires_at) for group in groups]
+
+    async def apply_many(self, kind, roblox_ids):
+        """Применить санкцию к списку roblox_id; список групп читается один раз"""
+        targets = []
+        for roblox_id in roblox_ids:
+            telegram_id = self.cache.get_telegram_id(int(roblox_id))
+            expires_at = self.cache.get_expiry(kind, int(roblox_id))
+            if telegram_id is not None and expires_at is not None:
+                targets.append((telegram_id, expires_at))
+        if not targets:
+            return []
+        groups = await self.db.get_all_groups()
+        return [
+            self._call(group[0], telegram_id, kind, expires_at)
+            for telegram_id, expires_at in targets
+            for group in groups
+        ]
+
+    async def lift(self, kind, roblox_id):
+        """Снять ограничения после окончания санкции"""
+        if kind == 'mute' and self.cache.is_banned(int(roblox_id)):
+            # Выдача всех прав изменила бы статус участника, которого забанили
+            return []
+        telegram_id = self.cache.get_telegram_id(int(roblox_id))
+        if telegram_id is None:
+            return []
+        groups = await self.db.get_all_groups()
+        return [self._call(group[0], telegram_id, kind, None, lift=True) for group in groups]
+
+    def apply_in_chat(self, chat_id, telegram_id, kind, roblox_id):
+        """Повторить ограничение в одном чате, если нарушитель все же пишет
+
+        Повтор делается один раз на санкцию, чтобы при отсутствии прав у бота
+        не тратить вызов API на каждое сообщение.
+        """
+        expires_at = self.cache.get_expiry(kind, roblox_id)
+        key = (chat_id, telegram_id, kind)
+        if expires_at is None or self._fallback.get(key) == expires_at:
+            return
+        if len(self._fallback) >= self.MAX_FALLBACK_ENTRIES:
+            self._fallback.clear()
+        self._fallback[key] = expires_at
+        self._call(chat_id, telegram_id, kind, expires_at)
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+from aiohttp import web
+from webhook import WebhookReceiver
+
+logger = logging.getLogger(__name__)
+
+# Поля обновления, в которых лежит сообщение с чатом
+_MESSAGE_FIELDS = (
+    'message', 'edited_message', 'channel_post', 'edited_channel_post',
+    'my_chat_member', 'chat_member', 'chat_join_request'
+)
+
+
+def route_key(data):
+    """Ключ шардирования для обновления в виде JSON: id чата, иначе id пользователя"""
+    for field in _MESSAGE_FIELDS:
+        item = data.get(field)
+        if item and 'chat' in item:
+            return item['chat']['id']
+    callback = data.get('callback_query')
+    if callback:
+        message = callback.get('message')
+        if message and 'chat' in message:
+            return message['chat']['id']
+        return callback['from']['id']
+    for item in data.values():
+        if isinstance(item, dict) and 'from' in item:
+            return item['from']['id']
+    return data.get('update_id', 0)
+
+
+def _worker_entry(index, count, inbox, outbox):
+    """Точка входа процесса-обработчика"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - shard{index} - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(_run_worker(index, count, inbox, outbox))
+
+
+async def _run_worker(index, count, inbox, outbox):
+    """Процесс-обработчик: полный набор обработчиков бота, обновления - из очереди
+
+    Изменения модерации в своей БД отправляются в outbox, чтобы фронт
+    разослал их остальным процессам; полученные уведомления перечитывают
+    состояние из общей WAL-базы в локальный кэш.
+    """
+    import bot_main
+    from telegram import Update
+
+    bot_main.db.db.on_change = lambda kind, key: outbox.put(('invalidate', index, kind, key))
+    application = bot_main.build_application(polling=False)
+    loop = asyncio.get_running_loop()
+
+    await bot_main.initialize(application)
+    await application.start()
+    # Снятие санкций по сроку и восстановление отложенных удалений - только в шарде 0
+    metrics_port = bot_main.METRICS_PORT + index if bot_main.METRICS_PORT else 0
+    await bot_main.start_services(application, singletons=(index == 0), metrics_port=metrics_port)
+    logger.info(f"Shard {index}/{count} started")
+
+    try:
+        while True:
+            message = await loop.run_in_executor(None, inbox.get)
+            if message[0] == 'update':
+                await application.update_queue.put(Update.de_json(message[1], application.bot))
+            elif message[0] == 'invalidate':
+                await bot_main.db.refresh_cache(message[1], message[2])
+            elif message[0] == 'stop':
+                break
+    finally:
+        await application.stop()
+        await application.shutdown()
+        await bot_main.stop_services()
+
+
+class ShardRouter(WebhookReceiver):
+    """Фронт-процесс шардированного режима
+
+    Принимает обновления webhook'ом и раскладывает их по count процессам
+    по id чата, так что порядок внутри чата сохраняется. Общее состояние
+    модерации - в общей SQLite (WAL); об изменениях процессы сообщают
+    через очередь фронту, а он пересылает уведомления остальным.
+    Упавший процесс перезапускается.
+    """
+
+    def __init__(self, count, listen='0.0.0.0', port=8080, path='/telegram',
+                 secret_token=None, webhook_url=None, bot_token=None):
+        super().__init__(listen, port, path, secret_token, webhook_url)
+        self.count = count
+        self.bot_token = bot_token
+        self._ctx = multiprocessing.get_context('spawn')
+        self._inboxes = [self._ctx.Queue() for _ in range(count)]
+        self._outbox = self._ctx.Queue()
+        self._processes = [None] * count
+        self._stopping = False
+
+    def _spawn(self, index):
+        process = self._ctx.Process(
+            target=_worker_entry,
+            args=(index, self.count, self._inboxes[index], self._outbox),
+            name=f'shard-{index}',
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+
+    def _relay_invalidations(self):
+        """Поток фронта: рассылка уведомлений об изменениях остальным процессам"""
+        while True:
+            message = self._outbox.get()
+            if message is None:
+                return
+            _, source, kind, key = message
+            for index, inbox in enumerate(self._inboxes):
+                if index != source:
+                    inbox.put(('invalidate', kind, key))
+
+    async def accept(self, request):
+        try:
+            data = await request.json()
+            shard = route_key(data) % self.count
+        except Exception as e:
+            logger.warning(f"Bad webhook payload: {e}")
+            return web.Response(status=400)
+        self._inboxes[shard].put(('update', data))
+        return web.Response(status=200)
+
+    def not_ready(self):
+        alive = sum(1 for process in self._processes if process is not None and process.is_alive())
+        if alive == self.count:
+            return None
+        return f'{alive}/{self.count} shards alive'
+
+    @staticmethod
+    def _migrate():
+        """Миграции схемы - один раз во фронте, до запуска процессов"""
+        from database import Database
+        database = Database()
+        try:
+            database.init_db()
+        finally:
+            database.close()
+
+    async def run(self):
+        self._migrate()
+        for index in range(self.count):
+            self._spawn(index)
+        relay = threading.Thread(target=self._relay_invalidations, name='shard-relay', daemon=True)
+        relay.start()
+
+        await self.serve()
+        if self.webhook_url:
+            from telegram import Bot
+            async with Bot(self.bot_token) as bot:
+                await self.register(bot)
+        logger.info(f"Shard router listening on {self.listen}:{self.port}{self.path}, {self.count} shards")
+
+        try:
+            while True:
+                await asyncio.sleep(1)
+                for index, process in enumerate(self._processes):
+                    if not process.is_alive():
+                        logger.error(f"Shard {index} exited with code {process.exitcode}, restarting")
+                        self._spawn(index)
+        finally:
+            await self.close()
+            for inbox in self._inboxes:
+                inbox.put(('stop',))
+            for process in self._processes:
+                process.join(timeout=10)
+            self._outbox.put(None)
@@ -0,0 +1,122 @@
+"""Повторы, Retry-After и таймауты RobloxAPI._request на локальном стаб-сервере
+
+    python -m pytest tests
+"""
+import asyncio
+import time
+import unittest
+
+from aiohttp import web
+
+from roblox_api import RobloxAPI
+from roblox_cache import CachedRobloxAPI
+
+
+class StubServer:
+    """HTTP-сервер, отвечающий по сценарию: список (status, headers, body, задержка)"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []  # время каждого запроса (monotonic)
+        self._runner = None
+
+    async def handle(self, request):
+        self.requests.append(time.monotonic())
+        status, headers, body, delay = self.responses.pop(0)
+        if delay:
+            await asyncio.sleep(delay)
+        return web.json_response(body, status=status, headers=headers)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route('*', '/{path:.*}', self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '127.0.0.1', 0).start()
+        return f"http://127.0.0.1:{self._runner.addresses[0][1]}"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+class RobloxRequestTest(unittest.IsolatedAsyncioTestCase):
+
+    async def start(self, responses, **kwargs):
+        self.server = StubServer(responses)
+        url = await self.server.start()
+        self.api = RobloxAPI(legacy_url=url, users_url=url, backoff=0.01, **kwargs)
+        self.url = url
+        self.addAsyncCleanup(self.server.stop)
+        self.addAsyncCleanup(self.api.close)
+
+    async def test_429_waits_for_retry_after(self):
+        await self.start([
+            (429, {'Retry-After': '1'}, {}, 0),
+            (200, {}, {'id': 1}, 0),
+        ])
+        status, data = await self.api._request('test', 'GET', f"{self.url}/v1/users/1")
+        self.assertEqual((status, data), (200, {'id': 1}))
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertGreaterEqual(self.server.requests[1] - self.server.requests[0], 1.0)
+
+    async def test_long_retry_after_is_not_awaited(self):
+        await self.start([(429, {'Retry-After': '3600'}, {}, 0)], timeout=2)
+        started = time.monotonic()
+        status, data = await self.api._request('test', 'GET', f"{self.url}/v1/users/1")
+        self.assertEqual((status, data), (429, None))
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    async def test_5xx_then_200_is_retried(self):
+        await self.start([
+            (503, {}, {}, 0),
+            (500, {}, {}, 0),
+            (200, {}, {'data': []}, 0),
+        ], max_retries=2)
+        status, data = await self.api._request('test', 'POST', f"{self.url}/v1/users", json={'userIds': [1]})
+        self.assertEqual((status, data), (200, {'data': []}))
+        self.assertEqual(len(self.server.requests), 3)
+
+    async def test_5xx_gives_up_after_max_retries(self):
+        await self.start([(502, {}, {}, 0)] * 2, max_retries=1)
+        status, data = await self.api._request('test', 'GET', f"{self.url}/v1/users/1")
+        self.assertEqual((status, data), (502, None))
+        self.assertEqual(len(self.server.requests), 2)
+
+    async def test_4xx_is_not_retried(self):
+        await self.start([(404, {}, {}, 0)])
+        status, data = await self.api._request('test', 'GET', f"{self.url}/users/get-by-username")
+        self.assertEqual((status, data), (404, None))
+        self.assertEqual(len(self.server.requests), 1)
+
+    async def test_timeout_is_retried_then_reported(self):
+        await self.start([(200, {}, {}, 1.0)] * 2, timeout=0.2, max_retries=1)
+        started = time.monotonic()
+        status, data = await self.api._request('test', 'GET', f"{self.url}/v1/users/1")
+        self.assertEqual((status, data), (None, None))
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    async def test_timeout_then_200(self):
+        await self.start([(200, {}, {}, 1.0), (200, {}, {'description': 'code'}, 0)], timeout=0.2)
+        status, data = await self.api._request('test', 'GET', f"{self.url}/v1/users/1")
+        self.assertEqual((status, data), (200, {'description': 'code'}))
+
+
+    async def test_description_failure_is_not_cached(self):
+        await self.start([
+            (503, {}, {}, 0),
+            (200, {}, {'id': 1, 'description': 'code 123'}, 0),
+        ], max_retries=0)
+        roblox = CachedRobloxAPI(self.api, description_ttl=30)
+        self.assertEqual(await roblox.get_user_description(1), '')
+        self.assertEqual(await roblox.get_user_description(1), 'code 123')
+        self.assertEqual(len(self.server.requests), 2)
+
+    async def test_description_of_missing_user(self):
+        await self.start([(404, {}, {}, 0)], max_retries=0)
+        self.assertEqual(await self.api.resolve_description(1), (False, ''))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""Прием обновлений WebhookServer: проверка секрета, готовность, update_queue
+
+    python -m pytest tests
+"""
+import asyncio
+import unittest
+
+import aiohttp
+
+from webhook import SECRET_HEADER, WebhookServer
+
+SECRET = 'test-secret'
+# Обновление в том виде, в каком его присылает Telegram
+RECORDED_UPDATE = {
+    'update_id': 10001,
+    'message': {
+        'message_id': 42,
+        'date': 1700000000,
+        'chat': {'id': -100123, 'type': 'supergroup', 'title': 'Test'},
+        'from': {'id': 555, 'is_bot': False, 'first_name': 'Tester'},
+        'text': 'hello',
+    },
+}
+
+
+class FakeApplication:
+    """То, что WebhookServer берет у Application"""
+
+    def __init__(self):
+        self.update_queue = asyncio.Queue()
+        self.bot = None
+        self.running = True
+
+
+class WebhookServerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.application = FakeApplication()
+        self.server = WebhookServer(self.application, listen='127.0.0.1', port=0, secret_token=SECRET)
+        await self.server.serve()
+        self.addAsyncCleanup(self.server.stop)
+        port = self.server._runner.addresses[0][1]
+        self.url = f"http://127.0.0.1:{port}"
+        self.session = aiohttp.ClientSession()
+        self.addAsyncCleanup(self.session.close)
+
+    async def post(self, headers, payload=RECORDED_UPDATE):
+        async with self.session.post(f"{self.url}/telegram", json=payload, headers=headers) as response:
+            return response.status
+
+    async def test_missing_secret_is_rejected(self):
+        self.server.ready = True
+        self.assertEqual(await self.post({}), 403)
+        self.assertTrue(self.application.update_queue.empty())
+
+    async def test_wrong_secret_is_rejected(self):
+        self.server.ready = True
+        self.assertEqual(await self.post({SECRET_HEADER: 'wrong'}), 403)
+        self.assertTrue(self.application.update_queue.empty())
+
+    async def test_not_ready_returns_503(self):
+        self.assertEqual(await self.post({SECRET_HEADER: SECRET}), 503)
+        async with self.session.get(f"{self.url}/readyz") as response:
+            self.assertEqual(response.status, 503)
+        self.assertTrue(self.application.update_queue.empty())
+
+    async def test_valid_update_lands_in_queue(self):
+        self.server.ready = True
+        self.assertEqual(await self.post({SECRET_HEADER: SECRET}), 200)
+        update = self.application.update_queue.get_nowait()
+        self.assertEqual(update.update_id, 10001)
+        self.assertEqual(update.effective_chat.id, -100123)
+        self.assertEqual(update.effective_message.text, 'hello')
+
+    async def test_bad_payload_returns_400(self):
+        self.server.ready = True
+        async with self.session.post(
+            f"{self.url}/telegram", data='not json', headers={SECRET_HEADER: SECRET}
+        ) as response:
+            self.assertEqual(response.status, 400)
+
+
+class WebhookSecretTest(unittest.TestCase):
+
+    def test_secret_required_without_webhook_url(self):
+        with self.assertRaises(ValueError):
+            WebhookServer(FakeApplication())
+
+    def test_secret_generated_for_registered_webhook(self):
+        server = WebhookServer(FakeApplication(), webhook_url='https://example.com/telegram')
+        self.assertTrue(server.secret_token)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import asyncio
+import functools
+import logging
+import sys
+from collections import deque
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class _Ticket:
+    """Место обновления в очередях своих ключей"""
+
+    __slots__ = ('keys', 'waiting', 'ready')
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.waiting = len(keys)  # в скольких очередях еще не первое
+        self.ready = asyncio.Event()
+
+
+class _KeyedQueues:
+    """FIFO-очереди обновлений по ключу, удаляются когда пустеют
+
+    Обновление встает во все свои очереди сразу при поступлении и
+    выполняется, когда оказывается первым в каждой из них. Порядок
+    постановки общий для всех ключей, поэтому самое раннее ожидающее
+    обновление всегда первое во всех своих очередях - взаимных блокировок нет.
+    """
+
+    def __init__(self):
+        self._queues = {}  # key -> deque(_Ticket)
+
+    def enqueue(self, keys):
+        ticket = _Ticket(keys)
+        for key in keys:
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+            queue.append(ticket)
+            if len(queue) == 1:
+                ticket.waiting -= 1
+        if ticket.waiting == 0:
+            ticket.ready.set()
+        return ticket
+
+    def release(self, ticket):
+        """Убрать обновление из очередей (после обработки или при отмене)"""
+        for key in ticket.keys:
+            queue = self._queues[key]
+            if queue[0] is not ticket:
+                queue.remove(ticket)  # отменено, не дождавшись очереди
+                continue
+            queue.popleft()
+            if not queue:
+                del self._queues[key]
+                continue
+            following = queue[0]
+            following.waiting -= 1
+            if following.waiting == 0:
+                following.ready.set()
+
+    def __len__(self):
+        return len(self._queues)
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений с порядком внутри чата и пользователя
+
+    Обновления разных чатов обрабатываются одновременно (не более
+    max_concurrent_updates), а обновления одного чата и одного пользователя -
+    строго в порядке поступления: состояние авторизации в context.user_data
+    не меняется из двух обработчиков сразу. Сообщение в группе, чей автор
+    еще обрабатывается в личке, ждет его, и более поздние сообщения этой
+    группы ждут за ним - иначе порядок в чате нарушился бы. Ожидающие
+    своей очереди обновления не занимают слоты общего лимита.
+    """
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        # process_update базового класса держит свой семафор все время
+        # do_process_update, включая ожидание очереди. Чтобы ожидающие
+        # не занимали слоты, его лимит снят (задачи на каждое обновление
+        # Application создает и так), а лимит одновременно работающих
+        # обработчиков держит self._running
+        self._semaphore = asyncio.BoundedSemaphore(sys.maxsize)
+        self._running = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._queues = _KeyedQueues()
+
+    @staticmethod
+    def _keys(update):
+        keys = []
+        chat = getattr(update, 'effective_chat', None)
+        if chat is not None:
+            keys.append(('chat', chat.id))
+        user = getattr(update, 'effective_user', None)
+        if user is not None:
+            keys.append(('user', user.id))
+        return keys
+
+    async def do_process_update(self, update, coroutine):
+        # Постановка в очереди - до первого await, то есть в порядке поступления
+        ticket = self._queues.enqueue(self._keys(update))
+        try:
+            await ticket.ready.wait()
+            async with self._running:
+                await coroutine
+        finally:
+            self._queues.release(ticket)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def waiting_keys(self):
+        return len(self._queues)
+
+
+class ConcurrencyLimit:
+    """Общий лимит одновременных вызовов для группы обработчиков
+
+    Используется как декоратор при регистрации: тяжелые админские операции
+    занимают не больше limit слотов и не вытесняют проверку сообщений.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def __call__(self, callback):
+        @functools.wraps(callback)
+        async def wrapper(update, context, *args):
+            async with self._semaphore:
+                return await callback(update, context, *args)
+        return wrapper
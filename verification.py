@@ -0,0 +1,151 @@
+import asyncio
+import heapq
+import itertools
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PendingVerification:
+    """Ожидающая проверки заявка: код выдан, ждем его в описании профиля"""
+    __slots__ = ('telegram_id', 'roblox_id', 'code', 'first_name', 'roblox_username',
+                 'attempt', 'deadline', 'cancelled')
+
+    def __init__(self, telegram_id, roblox_id, code, first_name, roblox_username, deadline):
+        self.telegram_id = telegram_id
+        self.roblox_id = roblox_id
+        self.code = code
+        self.first_name = first_name
+        self.roblox_username = roblox_username
+        self.attempt = 0
+        self.deadline = deadline
+        self.cancelled = False
+
+
+class VerificationPoller:
+    """Фоновая проверка кодов верификации
+
+    Заявки лежат в куче по времени следующей проверки. Планировщик забирает
+    все наступившие заявки разом и проверяет их пулом из workers задач;
+    при неудаче следующая проверка откладывается экспоненциально
+    (initial_delay, x2, ... до max_delay), после deadline секунд заявка
+    снимается. При успехе вызывается on_verified(bot, entry),
+    по истечении срока - on_expired(bot, entry).
+    """
+
+    def __init__(self, db, roblox, on_verified, on_expired=None, workers=4,
+                 initial_delay=5, max_delay=120, deadline=900):
+        self.db = db
+        self.roblox = roblox
+        self.on_verified = on_verified
+        self.on_expired = on_expired
+        self.workers = workers
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self._heap = []
+        self._entries = {}  # telegram_id -> PendingVerification
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._bot = None
+
+    def submit(self, telegram_id, roblox_id, code, first_name=None, roblox_username=None):
+        """Поставить (или заменить) заявку пользователя на проверку"""
+        self.cancel(telegram_id)
+        entry = PendingVerification(
+            telegram_id, roblox_id, code, first_name, roblox_username,
+            time.monotonic() + self.deadline
+        )
+        self._entries[telegram_id] = entry
+        self._schedule(entry, self.initial_delay)
+
+    def cancel(self, telegram_id):
+        entry = self._entries.pop(telegram_id, None)
+        if entry is not None:
+            entry.cancelled = True
+
+    def pending_count(self):
+        return len(self._entries)
+
+    def _schedule(self, entry, delay):
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), entry))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self, bot):
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.workers)
+        while True:
+            try:
+                # Ждем до ближайшей проверки или новой заявки
+                self._wakeup.clear()
+                timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                if timeout is None or timeout > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                now = time.monotonic()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    entry = heapq.heappop(self._heap)[2]
+                    if not entry.cancelled:
+                        due.append(entry)
+
+                await asyncio.gather(*(self._check(entry, semaphore) for entry in due))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in verification poller: {e}")
+                await asyncio.sleep(1)
+
+    async def _check(self, entry, semaphore):
+        async with semaphore:
+            try:
+                description = await self.roblox.get_user_description(entry.roblox_id, recheck=True)
+            except Exception as e:
+                logger.error(f"Error polling verification for {entry.telegram_id}: {e}")
+                description = ''
+
+        if entry.cancelled:
+            return
+
+        if entry.code in description:
+            self._entries.pop(entry.telegram_id, None)
+            if await self.db.verify_user(entry.roblox_id):
+                await self._notify(self.on_verified, entry)
+            return
+
+        entry.attempt += 1
+        delay = min(self.initial_delay * 2 ** entry.attempt, self.max_delay)
+        if time.monotonic() + delay > entry.deadline:
+            self._entries.pop(entry.telegram_id, None)
+            await self._notify(self.on_expired, entry)
+            return
+        self._schedule(entry, delay)
+
+    async def _notify(self, callback, entry):
+        if callback is None:
+            return
+        try:
+            await callback(self._bot, entry)
+        except Exception as e:
+            logger.error(f"Error in verification callback for {entry.telegram_id}: {e}")
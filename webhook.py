@@ -0,0 +1,134 @@
+import hmac
+import logging
+import secrets
+from aiohttp import web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def webhook_secret(secret_token, webhook_url):
+    """Секрет для заголовка SECRET_HEADER
+
+    Без секрета любой POST на публичный порт принимался бы за обновление от
+    Telegram. Если секрет не задан, но webhook регистрирует сам бот, секрет
+    генерируется и передается в set_webhook; иначе запуск невозможен.
+    """
+    if secret_token:
+        return secret_token
+    if webhook_url:
+        logger.warning("WEBHOOK_SECRET is not set, using a generated secret for this run")
+        return secrets.token_urlsafe(32)
+    raise ValueError("WEBHOOK_SECRET is required in webhook mode when WEBHOOK_URL is not set")
+
+
+class WebhookReceiver:
+    """Общая часть webhook-серверов: проверка секрета, /healthz, /readyz, регистрация
+
+    Наследник реализует accept(request) для проверенного обновления
+    и not_ready() - None или причина, по которой сервер не готов.
+    """
+
+    def __init__(self, listen='0.0.0.0', port=8080, path='/telegram',
+                 secret_token=None, webhook_url=None):
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret_token = webhook_secret(secret_token, webhook_url)
+        self.webhook_url = webhook_url
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_post(path, self.handle_update)
+        self.app.router.add_get('/healthz', self.handle_health)
+        self.app.router.add_get('/readyz', self.handle_ready)
+
+    async def handle_update(self, request):
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            return web.Response(status=403)
+        return await self.accept(request)
+
+    async def accept(self, request):
+        raise NotImplementedError
+
+    def not_ready(self):
+        return None
+
+    async def handle_health(self, request):
+        return web.Response(text='ok')
+
+    async def handle_ready(self, request):
+        reason = self.not_ready()
+        if reason is None:
+            return web.Response(text='ready')
+        return web.Response(status=503, text=reason)
+
+    async def serve(self):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+
+    async def register(self, bot):
+        """Зарегистрировать webhook в Telegram (если задан webhook_url)"""
+        if self.webhook_url:
+            await bot.set_webhook(
+                self.webhook_url,
+                secret_token=self.secret_token,
+                allowed_updates=Update.ALL_TYPES
+            )
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class WebhookServer(WebhookReceiver):
+    """Встроенный aiohttp-сервер для приема обновлений через webhook
+
+    POST <path> - обновление от Telegram (проверяется секретный токен),
+    обновление кладется в application.update_queue;
+    GET /healthz - процесс жив; GET /readyz - бот готов принимать обновления.
+    """
+
+    def __init__(self, application, listen='0.0.0.0', port=8080, path='/telegram',
+                 secret_token=None, webhook_url=None):
+        super().__init__(listen, port, path, secret_token, webhook_url)
+        self.application = application
+        self.ready = False
+
+    async def accept(self, request):
+        if not self.ready:
+            # Telegram повторит доставку позже
+            return web.Response(status=503)
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            logger.warning(f"Bad webhook payload: {e}")
+            return web.Response(status=400)
+        await self.application.update_queue.put(update)
+        return web.Response(status=200)
+
+    def not_ready(self):
+        if self.ready and self.application.running:
+            return None
+        return 'not ready'
+
+    async def start(self):
+        await self.serve()
+        await self.register(self.application.bot)
+        self.ready = True
+        logger.info(f"Webhook server listening on {self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        """Перестать принимать обновления и закрыть сервер
+
+        Webhook в Telegram не удаляется: пока бот перезапускается,
+        Telegram копит обновления и доставит их после старта.
+        """
+        self.ready = False
+        await self.close()